@@ -1,24 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 import ipywidgets as widgets
 
 
-def prediction(row,rate):
-    """Returns predicted values for each row variable, for the next year, given a growth rate"""
-
-    return row[-1] * rate 
-
-def handle_gdp_data(gdp_dst):
+def forecast(all, H=1, method='fixed', rate=1.05, window=5, series='variables'):
+    """Returns forecasts of every series for the H years after the last one, in one vectorized operation.
+       method is 'fixed' (growth at rate), 'cagr' (trailing compound annual growth rate over window years)
+       or 'trend' (log-linear trend fitted on the last window years)"""
+
+    #Lay the long dataset out as a (series, years) matrix without pivoting:
+    codes, uniques = pd.factorize(all[series])
+    years = all['year'].values.astype(int)
+    first_year, last_year = years.min(), years.max()
+    Y = np.full((len(uniques), last_year - first_year + 1), np.nan)
+    Y[codes, years - first_year] = all['value'].values
+
+    if method != 'fixed' and Y.shape[1] < 2:
+        raise ValueError(f'method {method} needs at least two years of data')
+
+    last = Y[:, -1]
+    h = np.arange(1, H+1)
+
+    #Forecast all series and horizons at once:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if method == 'fixed':
+            F = last[:, None] * rate**h[None, :]
+        elif method == 'cagr':
+            window = min(window, Y.shape[1] - 1)
+            growth = (last / Y[:, -1-window])**(1/window)
+            F = last[:, None] * growth[:, None]**h[None, :]
+        elif method == 'trend':
+            window = min(window, Y.shape[1])
+            logY = np.log(Y[:, -window:])
+            t = np.arange(window) - (window-1)/2 # centered time, so the intercept is the mean
+            slope = (logY * t).sum(axis=1) / (t**2).sum()
+            F = np.exp(logY.mean(axis=1)[:, None] + slope[:, None] * ((window-1)/2 + h[None, :]))
+        else:
+            raise ValueError(f"unknown forecasting method {method!r}, use 'fixed', 'cagr' or 'trend'")
+
+    #Back to long format, sorted by year:
+    n = len(uniques)
+    return pd.DataFrame({series: uniques.take(np.tile(np.arange(n), H)),
+                         'year': np.repeat(last_year + h, n).astype(all['year'].dtype),
+                         'value': F.T.ravel()})
+
+def gdp_params(regions, transactions, price_units, tid='>1993<=2021'):
+    """ Return the parameters dictionary selecting the given values (rows) of the NRHP dataset """
+
+    return {'table': 'nrhp',
+    'format': 'BULK',
+    'lang': 'en',
+    'variables': [{'code': 'OMRÅDE', 'values': list(regions)},
+    {'code': 'TRANSAKT', 'values': list(transactions)},
+    {'code': 'PRISENHED', 'values': list(price_units)},
+    {'code': 'Tid', 'values': [tid]}]}
+
+class LocalDst:
+    """ Offline stand-in for DstApi serving get_data from an already downloaded BULK dataset,
+        useful for testing the batch functions without calling dst.dk """
+
+    def __init__(self, data):
+        self.data = data
+        self.calls = 0
+
+    def get_data(self, params):
+        """ Return the rows of the stored dataset selected by params, like DstApi.get_data """
+
+        self.calls += 1
+        I = pd.Series(True, index=self.data.index)
+        for var in params['variables']:
+            if var['code'] == 'Tid':
+                years = self.data['TID'].astype(int)
+                tid = var['values'][0]
+                if tid.startswith('>'):
+                    lower, upper = tid[1:].split('<=')
+                    I &= (years > int(lower)) & (years <= int(upper))
+                else:
+                    I &= years.isin([int(t) for t in var['values']])
+            else:
+                I &= self.data[var['code']].isin(var['values'])
+
+        return self.data.loc[I].reset_index(drop=True)
+
+def handle_gdp_panel(gdp_dst, regions, transactions=['B1GQD'], price_units=['V_C'], tid='>1993<=2021', max_workers=8):
+    """ Download the dataset for many regions, transactions and price units concurrently (one request
+        per region) and merge the results into one long panel indexed by (Area, Transaction, Price unit, year)"""
+
+    #Fetch every region in its own thread, the requests are I/O bound:
+    def fetch(region):
+        return gdp_dst.get_data(params=gdp_params([region], transactions, price_units, tid))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        parts = list(pool.map(fetch, regions))
+
+    #Merge and rename columns:
+    panel = pd.concat(parts, ignore_index=True)
+    panel = panel.rename(columns = {'OMRÅDE':'Area',
+                                    'TRANSAKT':'Transaction',
+                                    'PRISENHED':'Price unit',
+                                    'TID':'year',
+                                    'INDHOLD':'value'})
+
+    #Typed year and value columns, missing values ('..') become NaN:
+    panel['year'] = panel['year'].astype(int)
+    panel['value'] = pd.to_numeric(panel['value'], errors='coerce')
+
+    #Set the MultiIndex:
+    panel = panel.set_index(['Area', 'Transaction', 'Price unit', 'year']).sort_index()
+
+    return panel
+
+def handle_gdp_data(gdp_dst, tid='>1993<=2021'):
     """ Download the dataset and prepare it by selecting the desired variables, dropping 
-        unimportant ones, renaming for the sake of clarity and indexing, and transposing it"""
+        unimportant ones and renaming for the sake of clarity, in long format (variables, year, value).
+        tid selects the years to download, e.g. '2022' to only fetch a newly published year"""
 
     #Define parameters dictionary to select only specified values (rows) of dataset:
-    par_gdp = {'table': 'nrhp',
-    'format': 'BULK',
-    'lang': 'en',
-    'variables': [{'code': 'OMRÅDE', 'values': ['000']},
-    {'code': 'TRANSAKT', 'values': ['B1GQD']},
-    {'code': 'PRISENHED', 'values': ['V_C']},
-    {'code': 'Tid', 'values': ['>1993<=2021']}]}
+    par_gdp = gdp_params(['000'], ['B1GQD'], ['V_C'], tid)
 
     #Download the specific dataset by specified parameters:
     gdp = gdp_dst.get_data(params=par_gdp)
@@ -26,131 +126,214 @@ def handle_gdp_data(gdp_dst):
     #Rename columns:
     gdp.rename(columns = {'OMRÅDE':'Area', 
                         'PRISENHED':'Price unit', 
-                        'TID':'variables', #helpfull later
-                        'INDHOLD':'GDP'}, inplace=True)
+                        'TID':'year',
+                        'INDHOLD':'value'}, inplace=True)
 
     #Drop unimportant variables
     gdp.drop(['TRANSAKT', 'Area', 'Price unit'], axis='columns', inplace=True)
 
-    #Make column names a mix of text and numbers (without spaces) and set index:
-    import string 
-
-    for value in gdp['variables'].values:
-        gdp.loc[gdp['variables'].values == value,['variables']] = 'value'+str(value)
-    gdp = gdp.set_index('variables')
-
-    #Transpose
-    gdp = gdp.T
+    #Typed columns, the only variable is GDP:
+    gdp['year'] = gdp['year'].astype('int16')
+    gdp['value'] = pd.to_numeric(gdp['value'], errors='coerce').astype(float)
+    gdp.insert(0, 'variables', pd.Categorical(['GDP'] * len(gdp)))
 
     return gdp
 
 def handle_consumption_data(cop):
     """ Prepare the dataset by droping unecessary information, renaming variables to 
-        make it easier to work with them and resetting the index"""
+        make it easier to work with them and reshaping it to long format (variables, year, value)"""
     
     #Drop NaN columns:
     drop_these = ['Unnamed: ' + str(num) for num in range(2)] # use list comprehension to create list of columns
     cop.drop(drop_these, axis=1, inplace=True) # axis = 1 -> columns, inplace=True -> changed, no copy made
 
-    #Rename consumption and year columns:
+    #Rename consumption column:
     cop.rename(columns = {'Unnamed: 2':'variables'}, inplace=True)
-    col_dict = {}
-    col_dict = {str(i) : f'value{i}' for i in range(1994,2021+1)}
-    cop.rename(columns = col_dict, inplace=True)
 
     #Drop unimportant variables:
     I = cop.variables.str.contains('Household textiles')
-    cop.loc[I, :]
-    cop = cop.loc[I == False] # keeping everything else
+    cop = cop.loc[I == False].copy() # keeping everything else
 
     #Reset the index
     cop.reset_index(inplace = True, drop = True) # Drop old index too
-    cop.iloc[0:7,:]
 
     #Remove numbers from consumption categories:
-    for value in cop['variables'].values:
-        cop.loc[cop['variables'].values == value,['variables']] = value.strip('0123456789.')
-
-    cop.loc[0,['variables']] = 'Total consumption'
-
-    #Set variables as index:
-    cop = cop.set_index('variables')
+    variables = [value.strip('0123456789.') for value in cop['variables'].values]
+    variables[0] = 'Total consumption'
+    cop['variables'] = pd.Categorical(variables, categories=variables)
+
+    #Reshape the year columns (the excel file is wide) into long format, once and for all:
+    cop = cop.melt(id_vars='variables', var_name='year', value_name='value')
+    cop['year'] = cop['year'].astype('int16')
+    cop['value'] = cop['value'].astype(float)
     
     return cop
 
 def concatenate_datasets(cop, gdp):
-    """ Check if the datasets have the same variables and concatenate them"""
+    """ Check if the datasets have the same years and concatenate them"""
 
-    #Check if they have the same variables 
-    different_years = [y for y in cop.columns.unique() if y not in gdp.columns.unique()] 
-    print(f'Columns (years) found in cop data but not in gdp: {different_years}')
+    #Check if they have the same years 
+    different_years = sorted(set(cop['year'].unique()) - set(gdp['year'].unique()))
+    print(f'Years found in cop data but not in gdp: {different_years}')
 
     if different_years != []:
-        return print("Not all variables are present in both datasets")
+        return print("Not all years are present in both datasets")
     else:
-       #Concatenate them
-        all = pd.concat([cop,gdp])
+       #Concatenate them, keeping the variables categorical and the rows sorted by year
+        categories = list(cop['variables'].cat.categories) + list(gdp['variables'].cat.categories)
+        cop = cop.assign(variables = cop['variables'].cat.set_categories(categories))
+        gdp = gdp.assign(variables = gdp['variables'].cat.set_categories(categories))
+        all = pd.concat([cop,gdp], ignore_index=True)
+        all = all.sort_values(['year','variables'], kind='stable', ignore_index=True)
         return all
 
-   
-
 def accomodate_data(all, scalar = 1000):
     """ Standardize all units """
 
-    #Rename index:
-    all.index.names = ['variables']
-
     #Consumption is in DKK while GDP (per capita) is in 1000 DKK. It will be homogenized towards the unitary value.
-    for i in all.index.values:
-        if i != 'GDP':
-            all[all.index == i] = all[all.index == i] / scalar
+    I = all['variables'] != 'GDP'
+    all.loc[I, 'value'] = all.loc[I, 'value'] / scalar
     
     return all
 
-def analysis(all):
-    """ Make a prediction for 2022 and check each variable over GDP """
-
-    #Create new column, year2022, which contains values 
-    #given a 0.05 growth rate prediction of every variable in year 2022:
-    all['value2022'] = all.apply(prediction, rate=1.05, axis=1)
-
-    #Check consumption of each variable over GDP:
-    for val in all.index:
-        all.loc[val + "/GDP"] = all.loc[val] / all.loc["GDP"]
+def analysis(all, rate=1.05, H=1, method='fixed', window=5):
+    """ Make a prediction for the H years after the last one (2022) and check each variable over GDP """
+
+    #Create rows for the following years, e.g. 2022, which contain values 
+    #given a 0.05 growth rate prediction (or another forecasting method) of every variable:
+    all = pd.concat([all, forecast(all, H=H, method=method, rate=rate, window=window)], ignore_index=True)
+
+    #Check consumption of each variable over GDP, matching every row with the GDP of its year:
+    gdp = all.loc[all['variables'] == 'GDP'].set_index('year')['value']
+    base = list(all['variables'].cat.categories)
+    categories = base + [val + '/GDP' for val in base]
+    codes = all['variables'].cat.codes.values
+    ratio = pd.DataFrame({'variables': pd.Categorical.from_codes(codes + len(base), categories=categories),
+                          'year': all['year'].values,
+                          'value': all['value'].values / all['year'].map(gdp).values})
+    all = all.assign(variables = pd.Categorical.from_codes(codes, categories=categories))
+    all = pd.concat([all, ratio], ignore_index=True)
+    all = all.sort_values(['year','variables'], kind='stable', ignore_index=True)
 
     #Set decimal units
-    all = all.astype(float).round(decimals=2)
+    all['value'] = all['value'].round(decimals=2)
     
     return all
 
+def to_wide(all):
+    """ Return the dataset as a table with one row per variable and one column per year, for display"""
+
+    return all.pivot(index='variables', columns='year', values='value')
+
 def handle_data_graph(all):
     """ Change the data format to make it suitable for graphing"""
 
-    #Reset the index:
-    all = all.reset_index()
-
-    #Transform dataframe from wide to long format:
-    all_long = pd.wide_to_long(all, stubnames='value', i='variables', j='year')
+    #The dataset is already in long format, only the index is reset:
+    all_long = all.reset_index(drop=True)
 
     #Save a copy of the final format of our dataset (uncomment to run the code):
-    #all_long.to_csv('data/FU07_cp_long.xlsx', index=False)
-
-    #Reset the index again
-    all_long = all_long.reset_index()
+    #all_long.to_csv('data/FU07_cp_long.csv', index=False)
 
     return all_long
 
+def group_series(all_long):
+    """ Group the long dataset by variable once, returning a dictionary with contiguous arrays of years and values for each variable"""
+
+    #Stable sort by variable keeps the years sorted within each variable:
+    codes, uniques = pd.factorize(all_long['variables'])
+    order = np.argsort(codes, kind='stable')
+    years = all_long['year'].values[order]
+    values = all_long['value'].values[order]
+
+    #Split at the boundaries between variables:
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    return {variable: (x, y) for variable, x, y in zip(uniques, np.split(years, bounds), np.split(values, bounds))}
+
 def plot_graph(all_long):
     """ Plot an interactive graph"""
 
-    def plot_e(df, variable): 
-        I = df['variables'] == variable
-        ax=df.loc[I,:].plot(x='year', y='value', style='-o', legend=False)
+    import matplotlib.pyplot as plt
+
+    series = group_series(all_long)
+
+    def plot_e(series, variable): 
+        x, y = series[variable]
+        fig, ax = plt.subplots()
+        ax.plot(x, y, '-o')
+        ax.set_xlabel('year')
 
     return widgets.interact(plot_e, 
-            df = widgets.fixed(all_long),
+            series = widgets.fixed(series),
             variable = widgets.Dropdown(description='variables', 
-                                            options=all_long.variables.unique(), 
+                                            options=list(series.keys()), 
                                             value='Total consumption')
-        ); 
+        );
+
+def save_graphs(all_long, folder='graphs', fmt='png'):
+    """ Save a graph of every variable to an image file in folder, without widgets or a display.
+        One Agg figure is reused for all the graphs"""
+
+    import os
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    os.makedirs(folder, exist_ok=True)
+    series = group_series(all_long)
+
+    #Create the figure and the line once:
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1,1,1)
+    line, = ax.plot([], [], '-o')
+    ax.set_xlabel('year')
+
+    #Only update the data for each variable:
+    paths = []
+    for variable, (x, y) in series.items():
+        line.set_data(x, y)
+        ax.relim()
+        ax.autoscale_view()
+        ax.set_title(variable.strip())
+        name = ''.join(c if c.isalnum() else '_' for c in variable.strip())
+        path = os.path.join(folder, f'{name}.{fmt}')
+        fig.savefig(path)
+        paths.append(path)
+
+    return paths
+
+def append_year(all, cop, gdp, year, scalar = 1000, rate = 1.05, H = 1, method = 'fixed', window = 5):
+    """ Append a newly published year to the dataset returned by analysis, called with the same rate, H, method and window.
+        Only the new year's rows are standardized and the stored years before it are kept as they are,
+        the prediction is made again from the stored history and the new year"""
+
+    #Standardize the new year only:
+    cop = cop.loc[cop['year'] == year]
+    gdp = gdp.loc[gdp['year'] == year]
+
+    #Check that both datasets contain the new year, consumption is often published before GDP:
+    missing = [name for name, data in (('consumption', cop), ('GDP', gdp)) if data.empty]
+    if missing != []:
+        raise ValueError(f'Year {year} missing in the {" and ".join(missing)} data')
+
+    new = accomodate_data(concatenate_datasets(cop, gdp), scalar)
+
+    #Check that the new year covers the same variables as the stored dataset:
+    base = [val for val in all['variables'].cat.categories if not val.endswith('/GDP')]
+    missing = [val for val in base if val not in set(new['variables'])]
+    if missing != []:
+        raise ValueError(f'Variables missing in the new year {year}: {missing}')
+
+    #The dataset is sorted by year, so the stored years before this one are kept:
+    keep = all['year'].searchsorted(year)
+    history = all.iloc[:keep]
+    history = history.loc[history['variables'].isin(base)]
+
+    #Predict from the stored history and the new year, and replace the tail from this year onwards (the old prediction):
+    history = history.assign(variables = history['variables'].cat.set_categories(base))
+    new = new.assign(variables = new['variables'].cat.set_categories(base), year = new['year'].astype(history['year'].dtype))
+    tail = analysis(pd.concat([history, new], ignore_index=True), rate=rate, H=H, method=method, window=window)
+    tail = tail.loc[tail['year'] >= year]
+    tail = tail.assign(variables = tail['variables'].astype(all['variables'].dtype))
+    all = pd.concat([all.iloc[:keep], tail], ignore_index=True)
 
+    return all
@@ -0,0 +1,83 @@
+import math
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+class BasinCache:
+    """ index of the local minima found by a multi-start, with a skip rule in the style of multi-level single linkage (MLSL):
+        a start is not solved if a known minimum lies within the critical distance r_k, and that minimum is reused.
+        Only minima are indexed, not the starts that led to them, so a skipped start is always close to a point
+        the local solver has converged to and would almost surely descend to it again """
+
+    def __init__(self, dim, volume, sigma=4.0, max_radius=1.0, xtol=1e-4, rebuild=32):
+        """ setup
+
+        Args:
+
+            dim (int): dimension of the problem
+            volume (float): volume of the search domain
+            sigma (float): MLSL constant, larger values give larger critical distances
+            max_radius (float): cap on the critical distance, should be below the typical basin radius
+            xtol (float): minima closer than xtol are the same basin
+            rebuild (int): number of new minima kept outside the KD-tree before it is rebuilt
+
+        """
+
+        self.dim = dim
+        self.volume = volume
+        self.sigma = sigma
+        self.max_radius = max_radius
+        self.xtol = xtol
+        self.rebuild = rebuild
+
+        # a. known minima, one per basin
+        self.x_min = np.empty((0,dim))
+        self.f_min = np.empty(0)
+        self.tree = None
+        self.n_tree = 0 # minima in the tree, the rest are scanned directly
+
+        # b. counters
+        self.k = 0 # starts seen
+        self.n_skipped = 0
+
+    def radius(self):
+        """ MLSL critical distance r_k = (Gamma(1+d/2)*volume*sigma*log(k)/k)**(1/d)/sqrt(pi), capped at max_radius """
+
+        if self.k < 2: return self.max_radius
+        log_r = (math.lgamma(1+self.dim/2) + math.log(self.volume*self.sigma*math.log(self.k)/self.k))/self.dim - 0.5*math.log(math.pi)
+        return min(math.exp(log_r),self.max_radius)
+
+    def lookup(self, x0):
+        """ return the basin of start x0, or None if it should be solved """
+
+        self.k += 1
+        r = self.radius()
+
+        # a. minima within r, from the tree and from the minima added since it was built
+        idx = [] if self.tree is None else self.tree.query_ball_point(x0,r)
+        recent = np.arange(self.n_tree,self.f_min.size)
+        idx = np.concatenate((np.asarray(idx,dtype=np.int64),recent[np.sum((self.x_min[recent]-x0)**2,axis=1) <= r**2]))
+        if idx.size == 0: return None
+
+        # b. skip and reuse the nearest of them
+        self.n_skipped += 1
+        return idx[np.argmin(np.sum((self.x_min[idx]-x0)**2,axis=1))]
+
+    def add(self, x, f):
+        """ add a minimum x with value f found by a solved start, returns its basin """
+
+        # a. known basin if it is within xtol of a known minimum
+        dist = np.sqrt(np.sum((self.x_min-x)**2,axis=1))
+        if dist.size > 0 and dist.min() <= self.xtol:
+            return int(np.argmin(dist))
+
+        # b. new basin
+        self.x_min = np.vstack((self.x_min,x))
+        self.f_min = np.append(self.f_min,f)
+
+        # c. rebuild the tree once enough minima are outside it
+        if self.f_min.size - self.n_tree >= self.rebuild:
+            self.tree = cKDTree(self.x_min)
+            self.n_tree = self.f_min.size
+
+        return self.f_min.size-1
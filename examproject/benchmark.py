@@ -0,0 +1,258 @@
+""" benchmarks of the examproject solvers
+
+Run from the examproject folder as
+
+    python benchmark.py                 # all cases at all sizes
+    python benchmark.py --quick         # smallest size of each case only
+    python benchmark.py --cases worker3 # cases whose name contains worker3
+
+Each case is run at several problem sizes with fixed seeds. Wall time is the best of --repeat runs,
+peak memory is measured by tracemalloc in one extra run and evaluations are the model's own counters.
+Results are appended to a versioned results file together with the git commit and the machine, so runs can be compared
+across changes. The file is local to the machine and is not committed, timings only compare between runs on the same machine.
+The parallel cases need several cores, on a single core they measure the pool overhead only.
+
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from q1e1_2 import Worker
+from q1e3_4 import Worker1
+from q1e5 import Worker2
+from q1e6 import Worker3
+from q2 import hair_salon
+import q3
+
+VERSION = 1 # schema version of the results file
+RESULTS = 'benchmark_results.json'
+
+def count_u_func(model):
+    """ count the utility points evaluated by a Worker model, by shadowing u_func on the instance """
+
+    model.n_u = 0
+    u_func = model.u_func
+
+    def counted(L,g):
+        u = u_func(L,g)
+        model.n_u += np.size(u)
+        return u
+
+    model.u_func = counted
+    return model
+
+def worker_case(cls,method,size,**kwargs):
+    """ setup a Worker sweep of length size, returns the run function """
+
+    def run():
+        model = count_u_func(cls())
+        if cls in (Worker1,Worker3):
+            model.par.tau = np.linspace(1e-8,1-1e-8,size)
+        if cls is Worker: # solution vectors are allocated in the constructor
+            model.par.G_vec = np.linspace(1.0,2.0,size)
+            model.sol.L_vec = np.zeros(size)
+            model.sol.u_vec = np.zeros(size)
+        elif cls is not Worker1: # Worker1 computes G from tau
+            model.par.G_vec = np.linspace(1e-8,100-1e-8,size)
+        getattr(model,method)(**kwargs)
+        return model.n_u
+
+    return run
+
+def worker3_tau_case(size):
+    """ setup the nested optimal tax search of Worker3, size is unused """
+
+    def run():
+        model = count_u_func(Worker3())
+        model.solve_tau(do_print=False)
+        return model.n_u
+
+    return run
+
+def hair_salon_case(method,size,**kwargs):
+    """ setup a hair_salon run with K = size simulations, returns the run function """
+
+    def run():
+        np.random.seed(0)
+        model = hair_salon(do_print=False)
+        getattr(model,method)(K=size,**kwargs)
+        return model.stats.simulations
+
+    return run
+
+def dp_case(size):
+    """ setup the dynamic programming solver of hair_salon with size kappa nodes, counting Bellman evaluations """
+
+    def run():
+        model = hair_salon(do_print=False)
+        model.solve_dp(n_kappa=size,do_print=False)
+        return model.sol.dp_iterations*size*model.sol.dp_l.size # Bellman evaluations, one per (kappa,l) node and update
+
+    return run
+
+def griewank_case(size,parallel=False,**kwargs):
+    """ setup a refined multi-start with max_iterations = size, returns the run function """
+
+    def run():
+        if parallel:
+            out = q3.refined_global_optimizer_parallel([-600,600],1e-8,10,size,n_workers=1,seed=0,do_print=False,return_history=True,**kwargs)
+        else:
+            np.random.seed(0)
+            out = q3.refined_global_optimizer([-600,600],1e-8,10,size,do_print=False,return_history=True,**kwargs)
+        return out[3].total_nfev
+
+    return run
+
+# name: (setup function of the size, sizes)
+CASES = {
+    'worker_solve': (lambda n: worker_case(Worker,'solve',n,do_print=False), [100,1000]),
+    'worker_solve_analytic': (lambda n: worker_case(Worker,'solve_analytic',n), [10_000,1_000_000]),
+    'worker1_solve': (lambda n: worker_case(Worker1,'solve',n), [100,1000]),
+    'worker1_solve_analytic': (lambda n: worker_case(Worker1,'solve_analytic',n), [10_000,1_000_000]),
+    'worker2_solve': (lambda n: worker_case(Worker2,'solve',n), [100,1000]),
+    'worker2_solve_vec': (lambda n: worker_case(Worker2,'solve_vec',n), [10_000,100_000]),
+    'worker3_solve': (lambda n: worker_case(Worker3,'solve',n), [100,1000]),
+    'worker3_solve_vec': (lambda n: worker_case(Worker3,'solve_vec',n), [10_000,100_000]),
+    'worker3_solve_tau': (worker3_tau_case, [1]),
+    'hair_salon_H': (lambda K: hair_salon_case('H',K,delta=0.05), [10,50]),
+    'hair_salon_H_vec': (lambda K: hair_salon_case('H_vec',K,delta=0.05), [1000,10_000]),
+    'hair_salon_delta_solve2': (lambda K: hair_salon_case('delta_solve2',K,seed=0), [50,500]),
+    'hair_salon_delta_search': (lambda K: hair_salon_case('delta_search',K,do_print=False), [1000,10_000]),
+    'hair_salon_solve_dp': (dp_case, [100,300]),
+    'griewank_refined': (lambda n: griewank_case(n), [100,1000]),
+    'griewank_refined_parallel': (lambda n: griewank_case(n,parallel=True), [100,1000]),
+    'griewank_refined_basin_cache': (lambda n: griewank_case(n,parallel=True,basin_cache=True), [100,1000]),
+}
+
+def measure(run,repeat=3):
+    """ return the best wall time of repeat runs, the tracemalloc peak of one more run and the evaluations """
+
+    with contextlib.redirect_stdout(io.StringIO()): # some solvers always print
+
+        # a. wall time without tracing
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            evaluations = run()
+            times.append(time.perf_counter()-t0)
+
+        # b. peak memory, traced separately as tracing slows down python code
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return min(times), peak, evaluations
+
+def git_commit():
+    """ return the current git commit as from git describe, ending in -dirty with uncommitted changes, or None outside a repository """
+
+    try:
+        return subprocess.run(['git','describe','--always','--dirty'],capture_output=True,text=True,check=True).stdout.strip()
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(cases=None,quick=False,repeat=3,do_print=True):
+    """ run the benchmark cases and return a tidy table with a row per case and size
+
+    Args:
+
+        cases (str): only run cases whose name contains this string, default is all
+        quick (bool): only run the smallest size of each case
+        repeat (int): number of timed runs, the best is kept
+        do_print (bool): print each result as it is done
+
+    Returns:
+
+        results (DataFrame): case, size, time, peak_mb and evaluations
+
+    """
+
+    rows = []
+    for name, (setup, sizes) in CASES.items():
+        if cases is not None and cases not in name: continue
+        for size in sizes[:1] if quick else sizes:
+            elapsed, peak, evaluations = measure(setup(size),repeat=repeat)
+            rows.append({'case':name,'size':size,'time':elapsed,'peak_mb':peak/2**20,'evaluations':int(evaluations)})
+            if do_print:
+                print(f'{name:30s} size = {size:9d}: {elapsed:9.4f} secs, peak {peak/2**20:9.2f} MB, {int(evaluations):12d} evaluations')
+
+    return pd.DataFrame(rows,columns=['case','size','time','peak_mb','evaluations'])
+
+def load_results(path=RESULTS):
+    """ load all runs in the results file as one table, with a column per run attribute """
+
+    if not os.path.exists(path):
+        return pd.DataFrame()
+
+    with open(path) as f:
+        runs = json.load(f)['runs']
+
+    return pd.concat([pd.DataFrame(run['results']).assign(commit=run['commit'],date=run['date']) for run in runs],ignore_index=True)
+
+def save_results(results,path=RESULTS):
+    """ append a run to the results file """
+
+    # a. existing runs
+    data = {'version':VERSION,'runs':[]}
+    if os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+        if data['version'] != VERSION:
+            raise ValueError(f'{path} has version {data["version"]}, expected {VERSION}')
+
+    # b. new run with its environment
+    data['runs'].append({
+        'commit':git_commit(),
+        'date':datetime.datetime.now().isoformat(timespec='seconds'),
+        'python':platform.python_version(),
+        'numpy':np.__version__,
+        'machine':platform.machine(),
+        'cpu_count':os.cpu_count(),
+        'results':results.to_dict(orient='records'),
+    })
+
+    with open(path,'w') as f:
+        json.dump(data,f,indent=1)
+
+def compare(results,path=RESULTS):
+    """ return results with the time of the last saved run of each case and size and the speedup against it """
+
+    previous = load_results(path)
+    if previous.empty:
+        return results.assign(previous_time=np.nan,speedup=np.nan)
+
+    previous = previous.groupby(['case','size']).last()['time'].rename('previous_time').reset_index()
+    results = results.merge(previous,on=['case','size'],how='left')
+    return results.assign(speedup=results.previous_time/results.time)
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='benchmark the examproject solvers')
+    parser.add_argument('--cases',default=None,help='only run cases whose name contains this string')
+    parser.add_argument('--quick',action='store_true',help='only run the smallest size of each case')
+    parser.add_argument('--repeat',type=int,default=3,help='number of timed runs, the best is kept')
+    parser.add_argument('--output',default=RESULTS,help='results file')
+    parser.add_argument('--no-save',action='store_true',help='do not append the run to the results file')
+    args = parser.parse_args()
+
+    if os.cpu_count() == 1:
+        print('warning: a single core is available, the parallel cases only measure the pool overhead')
+
+    results = run_benchmarks(cases=args.cases,quick=args.quick,repeat=args.repeat)
+    print(compare(results,path=args.output).to_string(index=False))
+    if not args.no_save:
+        save_results(results,path=args.output)
@@ -0,0 +1,87 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+
+class CESUtility:
+    """ utility of the Worker2 and Worker3 models,
+        ((alpha*C**s + (1-alpha)*G**s)**(1/s))**(1-rho)-1)/(1-rho) - nu*L**(1+epsilon)/(1+rho) with s = (sigma-1)/sigma,
+        with the exponents computed once per parameter set """
+
+    def __init__(self,alpha,sigma,rho,nu,epsilon):
+        """ bind parameters and exponents """
+
+        self.alpha = alpha
+        self.s = (sigma-1)/sigma # CES exponent
+        self.one_m_rho = 1-rho # CRRA exponent
+        self.pow = 1+epsilon # disutility exponent
+        self.scale = nu/(1+rho) # disutility scale
+
+    def __call__(self,C,G,L):
+        """ evaluate utility, broadcasting C, G and L, in a few preallocated buffers
+
+        The CES aggregate and the CRRA transformation are evaluated in log-form,
+        log Q = log1p(alpha*expm1(s*log C)+(1-alpha)*expm1(s*log G))/s and expm1((1-rho)*log Q)/(1-rho),
+        which is exact and stable as sigma -> 1 and rho -> 1 and equals the Cobb-Douglas and log limits there.
+
+        """
+
+        shape = np.broadcast_shapes(np.shape(C),np.shape(G),np.shape(L))
+        if shape == (): # scalar callbacks from scalar optimizers
+            return self.scalar(float(C),float(G),float(L))
+
+        x = np.empty(shape)
+        y = np.empty(shape)
+
+        # a. log of the CES aggregate
+        np.log(C,out=x)
+        np.log(G,out=y)
+        if np.abs(self.s) < 1e-12: # Cobb-Douglas limit
+            x *= self.alpha
+            y *= 1-self.alpha
+            x += y
+        else:
+            x *= self.s
+            np.expm1(x,out=x)
+            x *= self.alpha
+            y *= self.s
+            np.expm1(y,out=y)
+            y *= 1-self.alpha
+            x += y
+            np.log1p(x,out=x)
+            x /= self.s
+
+        # b. CRRA transformation, log limit at rho = 1
+        if np.abs(self.one_m_rho) >= 1e-12:
+            x *= self.one_m_rho
+            np.expm1(x,out=x)
+            x /= self.one_m_rho
+
+        # c. disutility of labor
+        np.power(L,self.pow,out=y)
+        y *= self.scale
+        x -= y
+
+        return x[()]
+
+    def scalar(self,C,G,L):
+        """ evaluate utility for scalars with the same log-form """
+
+        # a. log of the CES aggregate
+        if abs(self.s) < 1e-12: # Cobb-Douglas limit
+            x = self.alpha*math.log(C) + (1-self.alpha)*math.log(G)
+        else:
+            x = math.log1p(self.alpha*math.expm1(self.s*math.log(C)) + (1-self.alpha)*math.expm1(self.s*math.log(G)))/self.s
+
+        # b. CRRA transformation, log limit at rho = 1
+        if abs(self.one_m_rho) >= 1e-12:
+            x = math.expm1(self.one_m_rho*x)/self.one_m_rho
+
+        # c. disutility of labor
+        return x - self.scale*L**self.pow
+
+@lru_cache(maxsize=32)
+def bind(alpha,sigma,rho,nu,epsilon):
+    """ return the utility kernel for a parameter set, reused across calls """
+
+    return CESUtility(alpha,sigma,rho,nu,epsilon)
@@ -0,0 +1,71 @@
+import numpy as np
+
+def exclusive_prod(c):
+    """ product of all other elements along the last axis, Π_{j!=i} c_j, without dividing by c_i """
+    left = np.ones_like(c)
+    right = np.ones_like(c)
+    left[...,1:] = np.cumprod(c[...,:-1],axis=-1)
+    right[...,:-1] = np.cumprod(c[...,:0:-1],axis=-1)[...,::-1]
+    return left*right
+
+def griewank(x):
+    """ return the d-dimensional Griewank function, 1 + Σ x_i**2/4000 - Π cos(x_i/sqrt(i)),
+        for a point of shape (d,) or a batch of points of shape (N,d) """
+    x = np.asarray(x,dtype=float)
+    scale = 1/np.sqrt(np.arange(1,x.shape[-1]+1))
+    return 1 + np.sum(x**2,axis=-1)/4000 - np.prod(np.cos(x*scale),axis=-1)
+
+def griewank_grad(x):
+    """ return the exact gradient of the Griewank function, shape (d,) or (N,d) """
+    x = np.asarray(x,dtype=float)
+    scale = 1/np.sqrt(np.arange(1,x.shape[-1]+1))
+    z = x*scale
+    return x/2000 + scale*np.sin(z)*exclusive_prod(np.cos(z))
+
+def griewank_hess(x):
+    """ return the exact Hessian of the Griewank function, shape (d,d) or (N,d,d) """
+    x = np.asarray(x,dtype=float)
+    d = x.shape[-1]
+    scale = 1/np.sqrt(np.arange(1,d+1))
+    z = x*scale
+    a = scale*np.sin(z)
+    c = np.cos(z)
+
+    # a. Π_{k!=i,j} cos(z_k): exclusive products of c with c_i replaced by 1, for every row i
+    C = np.repeat(c[...,None,:],d,axis=-2)
+    C[...,np.arange(d),np.arange(d)] = 1.0
+    M = exclusive_prod(C)
+
+    # b. off-diagonal -a_i*a_j*Π_{k!=i,j} c_k, diagonal 1/2000 + Π c_k/i
+    H = -a[...,:,None]*a[...,None,:]*M
+    H[...,np.arange(d),np.arange(d)] = 1/2000 + np.prod(c,axis=-1)[...,None]*scale**2
+    return H
+
+def griewank_hessp(x,p):
+    """ return the exact Hessian-vector product of the Griewank function at x with p, shape (d,) or (N,d),
+        in O(d) per point without forming the Hessian """
+    x = np.asarray(x,dtype=float)
+    p = np.broadcast_to(np.asarray(p,dtype=float),x.shape)
+    d = x.shape[-1]
+    scale = 1/np.sqrt(np.arange(1,d+1))
+    z = x*scale
+    a = scale*np.sin(z)
+    c = np.cos(z)
+    q = a*p
+
+    # a. prefix and suffix products of c as in exclusive_prod, and the sums Σ_j q_j Π_{k!=j} c_k over the same prefixes and suffixes
+    left = np.ones_like(c)
+    right = np.ones_like(c)
+    left[...,1:] = np.cumprod(c[...,:-1],axis=-1)
+    right[...,:-1] = np.cumprod(c[...,:0:-1],axis=-1)[...,::-1]
+    left_q = np.zeros_like(c)
+    right_q = np.zeros_like(c)
+    for i in range(1,d):
+        left_q[...,i] = left_q[...,i-1]*c[...,i-1] + left[...,i-1]*q[...,i-1]
+        right_q[...,d-1-i] = right_q[...,d-i]*c[...,d-i] + right[...,d-i]*q[...,d-i]
+
+    # b. Σ_{j!=i} q_j Π_{k!=i,j} c_k splits into j < i and j > i
+    off = left_q*right + left*right_q
+
+    # c. diagonal 1/2000 + Π c_k/i, off-diagonal -a_i*a_j*Π_{k!=i,j} c_k
+    return (1/2000 + np.prod(c,axis=-1)[...,None]*scale**2)*p - a*off
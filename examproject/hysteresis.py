@@ -0,0 +1,86 @@
+import numpy as np
+
+try: # numba is optional, without it the kernel runs as a numpy scan over periods
+    from numba import njit
+except ImportError:
+    njit = None
+
+def band_values_loops(kappa,l_star,l_star_pow,deltas,l_init,iota,eta,w,R):
+    """ ex-post lifetime values of the delta-band policy, as plain loops compiled by numba
+
+    Args:
+
+        kappa (ndarray): (K,T) kappa paths
+        l_star (ndarray): (K,T) optimal l paths
+        l_star_pow (ndarray): (K,T) optimal l paths to the power 1-eta, computed once for all deltas
+        deltas (ndarray): (D,) band widths
+        l_init,iota,eta,w,R (float): initial l, adjustment cost, elasticity, wage, discount factor
+
+    Returns:
+
+        h (ndarray): (D,K) discounted lifetime values
+
+    """
+
+    D = deltas.shape[0]
+    K,T = kappa.shape
+    h = np.zeros((D,K))
+
+    for d in range(D):
+        for k in range(K):
+            l_lag = l_init
+            l_pow = l_init**(1-eta)
+            value = 0.0
+            discounting = 1.0
+            for t in range(T):
+
+                # a. l only follows the optimal policy if it is more than delta away from it
+                if np.abs(l_lag-l_star[k,t]) > deltas[d]:
+                    l = l_star[k,t]
+                    l_pow = l_star_pow[k,t]
+                else:
+                    l = l_lag
+
+                # b. period value, with adjustment cost when l changes
+                period_value = kappa[k,t]*l_pow-w*l
+                if l != l_lag:
+                    period_value -= iota
+                value += discounting*period_value
+
+                discounting /= R
+                l_lag = l
+
+            h[d,k] = value
+
+    return h
+
+def band_values_numpy(kappa,l_star,deltas,l_init,iota,eta,w,R):
+    """ ex-post lifetime values of the delta-band policy, as a scan over periods vectorized over (delta,simulation) """
+
+    deltas = np.asarray(deltas,dtype=float)[:,None]
+    l_star_pow = l_star**(1-eta) # computed once for all deltas
+    l_lag = np.full((deltas.shape[0],kappa.shape[0]),float(l_init))
+    l_pow = l_lag**(1-eta)
+    h = np.zeros(l_lag.shape)
+
+    for t in range(kappa.shape[1]):
+        I = np.abs(l_lag-l_star[:,t]) > deltas
+        l = np.where(I,l_star[:,t],l_lag)
+        l_pow = np.where(I,l_star_pow[:,t],l_pow)
+        h += R**-t*(kappa[:,t]*l_pow-w*l-iota*(l != l_lag))
+        l_lag = l
+
+    return h
+
+if njit is None:
+    band_values = band_values_numpy
+else:
+    band_values_compiled = njit(cache=True)(band_values_loops)
+
+    def band_values(kappa,l_star,deltas,l_init,iota,eta,w,R):
+        """ ex-post lifetime values of the delta-band policy, with the compiled kernel """
+
+        l_star = np.ascontiguousarray(l_star,dtype=np.float64)
+
+        return band_values_compiled(np.ascontiguousarray(kappa,dtype=np.float64),l_star,l_star**(1-eta),
+                                    np.atleast_1d(np.asarray(deltas,dtype=np.float64)),float(l_init),float(iota),float(eta),float(w),float(R))
@@ -0,0 +1,78 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+def solve_chunk(model,start,stop,names,n):
+    """ solve one chunk of the sweep on a private copy of the model and write it into shared memory """
+
+    # a. solve the chunk with the model's own solver
+    G_vec, L_vec, u_vec, _ = model.solve(do_print=False)
+
+    # b. write results into the preallocated shared arrays
+    for name, values in zip(names,(G_vec,L_vec,u_vec)):
+        shm = shared_memory.SharedMemory(name=name)
+        out = np.ndarray(n,dtype=float,buffer=shm.buf)
+        out[start:stop] = values
+        del out
+        shm.close()
+
+def solve_parallel(model,n_workers=None,n_chunks=None):
+    """ solve the G/tau sweep of a Worker1, Worker2 or Worker3 model in chunks across a process pool
+
+    Args:
+
+        model (Worker1, Worker2 or Worker3): model to solve, its par is not changed by the workers
+        n_workers (int): number of processes, default is the number of cores
+        n_chunks (int): number of chunks the sweep is split in, default is 4 per process
+
+    Returns:
+
+        G_vec, L_vec, u_vec, tau: as the model's solve, but as arrays
+
+    """
+
+    par = model.par
+    sol = model.sol
+
+    # a. sweep length, tau is either a vector matching the sweep or a scalar
+    sweep_tau = np.ndim(par.tau) > 0
+    n = par.tau.size if sweep_tau else par.G_vec.size
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    n_chunks = 4*n_workers if n_chunks is None else n_chunks
+    edges = np.linspace(0,n,min(n_chunks,n)+1).astype(int)
+
+    # b. preallocated shared arrays for G, L and utility
+    shms = [shared_memory.SharedMemory(create=True,size=n*np.dtype(float).itemsize) for _ in range(3)]
+    names = [shm.name for shm in shms]
+
+    try:
+
+        # c. one private copy of the model per chunk, with the sweep vectors sliced
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = []
+            for start, stop in zip(edges[:-1],edges[1:]):
+                chunk = model.copy()
+                chunk.sol_memmap = None # chunks only live until written to shared memory
+                if sweep_tau: chunk.par.tau = par.tau[start:stop]
+                if np.size(par.G_vec) == n: chunk.par.G_vec = par.G_vec[start:stop]
+                futures.append(pool.submit(solve_chunk,chunk,start,stop,names,n))
+
+            for future in futures:
+                future.result() # raises if a chunk failed
+
+        # d. copy results out of shared memory
+        G_vec, L_vec, u_vec = [np.ndarray(n,dtype=float,buffer=shm.buf) for shm in shms]
+        par.G_vec = G_vec.copy()
+        model.allocate(n)
+        sol.L_vec[:] = L_vec
+        sol.u_vec[:] = u_vec
+        del G_vec, L_vec, u_vec
+
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    return par.G_vec, sol.L_vec, sol.u_vec, par.tau
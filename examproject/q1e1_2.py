@@ -3,7 +3,9 @@ from types import SimpleNamespace
 import numpy as np
 from scipy import optimize
 
-class Worker:
+from shared import ModelBase # shared modules at the root of the repository
+
+class Worker(ModelBase):
 
     def __init__(self):
         """ setup model parameters """
@@ -78,4 +80,37 @@ class Worker:
                 assert sol.L_vec[i] > 0, 'L is negative' # check that L is positive
 
         if do_print:
-            print('\nL and expected L are close and L is positive')
\ No newline at end of file
+            print('\nL and expected L are close and L is positive')
+
+    def solve_analytic(self,n_check=0,do_print=False):
+        """ solve model with the closed-form L*, vectorized over G (and omega, tau if arrays) """
+
+        par = self.par
+        sol = self.sol
+
+        # a. closed-form L*, written without the cancellation in -kappa+sqrt(...) 
+        par.omega_t = (1-par.tau)*par.omega # define omega_t
+        par.el = 2*(par.alpha/par.nu)*par.omega_t/(par.kappa+np.sqrt(par.kappa**2+4*(par.alpha/par.nu)*par.omega_t**2)) # define q3's L*
+
+        # b. solution vectors, broadcast over G, tau and omega, e.g. tau[:,None] and G_vec[None,:] give a tau x G grid
+        L, G = np.broadcast_arrays(par.el,par.G_vec)
+        sol.L_vec = L.astype(float)
+        sol.u_vec = self.u_func(sol.L_vec,G)
+
+        # c. check against the numerical optimizer on a sample of the points
+        if n_check > 0:
+            tau, omega = par.tau, par.omega
+            taus = np.broadcast_to(tau,L.shape).ravel()
+            omegas = np.broadcast_to(omega,L.shape).ravel()
+            try:
+                for i in np.unique(np.linspace(0,L.size-1,n_check).astype(int)):
+                    par.tau, par.omega = taus[i], omegas[i] # u_func reads tau and omega from par
+                    L_opt = optimize.minimize_scalar(self.value_of_choice,method='bounded',bounds=(1e-8,24),args=(G.flat[i])).x
+                    assert np.isclose(L_opt,sol.L_vec.flat[i],atol=1e-4), 'L and expected L are not close'
+            finally:
+                par.tau, par.omega = tau, omega
+
+        if do_print:
+            for g, l, u in zip(G.ravel(),sol.L_vec.ravel(),sol.u_vec.ravel()):
+                print(f'For G = {g:6.3f}: L = {l:6.3f}, utility = {u:6.3f}')
+
@@ -3,7 +3,11 @@ from types import SimpleNamespace
 import numpy as np
 from scipy import optimize
 
-class Worker1:
+from shared import ModelBase # shared modules at the root of the repository
+
+class Worker1(ModelBase):
+
+    sol_vectors = ('L_vec','u_vec') # allocated by .allocate()
 
     def __init__(self):
         """ setup model parameters """
@@ -24,8 +28,9 @@ class Worker1:
         par.el = []
         par.G_vec = []
 
-        sol.L_vec = []
-        sol.u_vec = []
+        # c. solution vectors, allocated by .allocate() on every solve
+        sol.L_vec = np.zeros(0)
+        sol.u_vec = np.zeros(0)
 
      
     def u_func(self,L,g):
@@ -58,8 +63,10 @@ class Worker1:
         guess = 7.0 # initial guess
         bound = (1e-8,24) # bounds for L
 
+        self.allocate(np.size(par.G_vec))
+
         # a. call solver
-        for  i, g in enumerate(par.G_vec):
+        for i, g in enumerate(par.G_vec):
             
             par.tau_separated = par.tau[i] # optimize with one value of tau at a time
             sol_case1 = optimize.minimize_scalar(
@@ -69,8 +76,35 @@ class Worker1:
                 bounds=(bound),
                 args=(g))
 
-                # b. append solution
-            sol.L_vec.append(sol_case1.x) # append optimal Ls
-            sol.u_vec.append(self.u_func(sol_case1.x,g)) # append the utility
+            # b. store solution
+            sol.L_vec[i] = sol_case1.x # store optimal Ls
+            sol.u_vec[i] = self.u_func(sol_case1.x,g) # store the utility
+
+        return par.G_vec, sol.L_vec, sol.u_vec, par.tau
+
+    def solve_analytic(self,n_check=0):
+        """ solve model with the closed-form L*, vectorized over the whole tau vector """
+
+        par = self.par
+        sol = self.sol
+
+        # a. closed-form L*, written without the cancellation in -kappa+sqrt(...) 
+        par.omega_t = (1-par.tau)*par.omega # define omega_t
+        par.el = 2*(par.alpha/par.nu)*par.omega_t/(par.kappa+np.sqrt(par.kappa**2+4*(par.alpha/par.nu)*par.omega_t**2)) # define q3's L*
+        par.G_vec = par.tau * par.omega * par.el * ((1-par.tau) * par.omega) # define vector of G
+
+        # b. solution vectors, u_func broadcasts over tau
+        par.tau_separated = par.tau
+        self.allocate(par.tau.size)
+        sol.L_vec[:] = par.el
+        sol.u_vec[:] = self.u_func(par.el,par.G_vec)
+
+        # c. check against the numerical optimizer on a sample of tau
+        if n_check > 0:
+            for i in np.unique(np.linspace(0,par.tau.size-1,n_check).astype(int)):
+                par.tau_separated = par.tau[i]
+                L = optimize.minimize_scalar(self.value_of_choice,method='bounded',bounds=(1e-8,24),args=(par.G_vec[i])).x
+                assert np.isclose(L,sol.L_vec[i],atol=1e-4), 'L and expected L are not close'
+
+        return par.G_vec, sol.L_vec, sol.u_vec, par.tau
 
-        return par.G_vec, sol.L_vec, sol.u_vec, par.tau
\ No newline at end of file
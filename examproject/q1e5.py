@@ -6,7 +6,13 @@ from scipy import optimize
 import pandas as pd 
 import matplotlib.pyplot as plt
 
-class Worker2:
+import ces
+from shared import ModelBase # shared modules at the root of the repository
+from vec_optimize import minimize_scalar_bounded
+
+class Worker2(ModelBase):
+
+    sol_vectors = ('L_vec','u_vec') # allocated by .allocate()
 
     def __init__(self):
         """ setup model parameters """
@@ -27,8 +33,9 @@ class Worker2:
 
         par.G_vec = np.linspace(1e-8, 100-(1e-8), 50000) # vector of g's
 
-        sol.L_vec = []
-        sol.u_vec = []
+        # c. solution vectors, allocated by .allocate() on every solve
+        sol.L_vec = np.zeros(0)
+        sol.u_vec = np.zeros(0)
 
      
     def u_func(self,L,g):
@@ -39,9 +46,11 @@ class Worker2:
 
         C = (par.kappa+(1-par.tau)*par.omega*L) # define consumptuon
         
-        G = g # par.tau*par.omega*sol_case1 # define government expenditure
+        G = g # define government expenditure
+
+        u = ces.bind(par.alpha,par.sigma,par.rho,par.nu,par.epsilon) # utility kernel, exponents computed once per parameter set
 
-        return ((((par.alpha*C**((par.sigma-1)/par.sigma) + (1-par.alpha)*G**((par.sigma-1)/(par.sigma)) )**(par.sigma/(par.sigma-1)) )**(1-par.rho) -1)/(1-par.rho))-par.nu*(L**(1+par.epsilon)/(1+par.rho))
+        return u(C,G,L)
 
     def value_of_choice(self,L,g):
         """ calculate value of choice """
@@ -59,8 +68,10 @@ class Worker2:
         guess = 7.0 # initial guess
         bound = (1e-8,24) # bounds for L
 
+        self.allocate(np.size(par.G_vec))
+
         # a. call solver
-        for  g in par.G_vec:
+        for i, g in enumerate(par.G_vec):
             
             sol_case1 = optimize.minimize_scalar(
                 self.value_of_choice,
@@ -69,18 +80,26 @@ class Worker2:
                 bounds=(bound),
                 args=(g)) 
 
-                # b. append solution
-            sol.L_vec.append(sol_case1.x) # append optimal Ls
-            sol.u_vec.append(self.u_func(sol_case1.x,g)) # append the utility
+            # b. store solution
+            sol.L_vec[i] = sol_case1.x # store optimal Ls
+            sol.u_vec[i] = self.u_func(sol_case1.x,g) # store the utility
 
         return par.G_vec, sol.L_vec, sol.u_vec, par.tau
-    
-
-
-
 
+    def solve_vec(self,xatol=1e-5):
+        """ solve model for all G at once with a vectorized bounded optimizer """
 
+        par = self.par
+        sol = self.sol
 
+        bound = (1e-8,24) # bounds for L
 
+        # a. call vectorized solver
+        res = minimize_scalar_bounded(self.value_of_choice,bound,args=(par.G_vec,),xatol=xatol)
 
+        # b. solution vectors
+        self.allocate(res.x.size)
+        sol.L_vec[:] = res.x
+        sol.u_vec[:] = -res.fun
 
+        return par.G_vec, sol.L_vec, sol.u_vec, par.tau
@@ -3,7 +3,13 @@ from types import SimpleNamespace
 import numpy as np
 from scipy import optimize
 
-class Worker3:
+import ces
+from shared import ModelBase # shared modules at the root of the repository
+from vec_optimize import minimize_scalar_bounded
+
+class Worker3(ModelBase):
+
+    sol_vectors = ('L_vec','u_vec') # allocated by .allocate()
 
     def __init__(self):
         """ setup model parameters """
@@ -24,8 +30,13 @@ class Worker3:
 
         par.G_vec = np.linspace(1e-8, 100-(1e-8), 50000) # vector of g's
 
-        sol.L_vec = []
-        sol.u_vec = []
+        # c. solution vectors, allocated by .allocate() on every solve
+        sol.L_vec = np.zeros(0)
+        sol.u_vec = np.zeros(0)
+
+        # d. counters of the optimal tax search, reset by .solve_tau()
+        sol.n_outer = 0 # number of tau evaluations
+        sol.n_inner = 0 # number of L solves
 
      
     def u_func(self,L,g):
@@ -35,10 +46,12 @@ class Worker3:
         sol = self.sol
 
         C = (par.kappa+(1-par.tau_separated)*par.omega*L) # define consumption
-       
-        G = g #par.tau*par.omega*sol_case1 #define government expenditure
+        
+        G = g # define government expenditure
 
-        return ((((par.alpha*C**((par.sigma-1)/par.sigma) + (1-par.alpha)*G**((par.sigma-1)/(par.sigma)) )**(par.sigma/(par.sigma-1)) )**(1-par.rho) -1)/(1-par.rho))-par.nu*(L**(1+par.epsilon)/(1+par.rho))
+        u = ces.bind(par.alpha,par.sigma,par.rho,par.nu,par.epsilon) # utility kernel, exponents computed once per parameter set
+
+        return u(C,G,L)
 
     def value_of_choice(self,L,g):
         """ calculate value of choice """
@@ -56,8 +69,10 @@ class Worker3:
         guess = 7.0 # initial guess
         bound = (1e-8,24) # bounds for L
 
+        self.allocate(np.size(par.G_vec))
+
         # a. call solver
-        for i,g in enumerate(par.G_vec):
+        for i, g in enumerate(par.G_vec):
             
             par.tau_separated = par.tau[i] # optimize with one value of tau at a time
             sol_case1 = optimize.minimize_scalar(
@@ -67,18 +82,86 @@ class Worker3:
                 bounds=(bound),
                 args=(g))
 
-            # b. append solution
-            sol.L_vec.append(sol_case1.x)  # append optimal Ls
-            sol.u_vec.append(self.u_func(sol_case1.x,g)) # append the utility
+            # b. store solution
+            sol.L_vec[i] = sol_case1.x # store optimal Ls
+            sol.u_vec[i] = self.u_func(sol_case1.x,g) # store the utility
 
         return par.G_vec, sol.L_vec, sol.u_vec, par.tau
-    
 
+    def solve_vec(self,xatol=1e-5):
+        """ solve model for all G at once with a vectorized bounded optimizer """
+
+        par = self.par
+        sol = self.sol
+
+        bound = (1e-8,24) # bounds for L
+
+        # a. call vectorized solver
+        par.tau_separated = par.tau # u_func broadcasts over the tau vector
+        res = minimize_scalar_bounded(self.value_of_choice,bound,args=(par.G_vec,),xatol=xatol)
+
+        # b. solution vectors
+        self.allocate(res.x.size)
+        sol.L_vec[:] = res.x
+        sol.u_vec[:] = -res.fun
+
+        return par.G_vec, sol.L_vec, sol.u_vec, par.tau
+
+    def solve_G(self,tau,G_init=1.0,tol=1e-6,maxiter=200):
+        """ solve L for a given tau with G consistent with G = tau*omega*L, by fixed-point iteration on G """
+
+        par = self.par
+        sol = self.sol
+
+        bound = (1e-8,24) # bounds for L
+        par.tau_separated = tau
+
+        # a. iterate G -> L(G) -> tau*omega*L(G) until G is consistent
+        G = G_init
+        for it in range(maxiter):
 
+            L = optimize.minimize_scalar(self.value_of_choice,method='bounded',bounds=bound,args=(G),options={'xatol':1e-10}).x
+            sol.n_inner += 1
+
+            G_new = tau*par.omega*L
+            if np.abs(G_new-G) < tol:
+                break
+            G = G_new
+
+        else:
+            raise Exception(f'G did not converge for tau = {tau}')
+
+        return L, G_new
+
+    def solve_tau(self,bounds=(1e-8,1-1e-8),xatol=1e-6,do_print=True):
+        """ find the optimal tax with an outer bounded search over tau and
+            the worker's L and the consistent G solved in the inner loop """
+
+        par = self.par
+        sol = self.sol
 
+        sol.n_outer = 0 # number of tau evaluations
+        sol.n_inner = 0 # number of L solves
+        sol.G_init = 1.0 # warm start for the G fixed point, updated after each tau
 
+        # a. objective, minus utility at the consistent (L,G)
+        def objective(tau):
+            sol.n_outer += 1
+            L, G = self.solve_G(tau,G_init=sol.G_init)
+            sol.G_init = G
+            return -self.u_func(L,G)
 
+        # b. outer search over tau
+        res = optimize.minimize_scalar(objective,method='bounded',bounds=bounds,options={'xatol':xatol})
 
+        # c. solution at the optimal tau
+        sol.tau_opt = res.x
+        sol.L_opt, sol.G_opt = self.solve_G(sol.tau_opt,G_init=sol.G_init)
+        sol.u_opt = self.u_func(sol.L_opt,sol.G_opt)
 
+        if do_print:
+            print(f'Optimal tau = {sol.tau_opt:6.5f}: L = {sol.L_opt:6.3f}, G = {sol.G_opt:6.3f}, utility = {sol.u_opt:6.5f}')
+            print(f'{sol.n_outer} tau evaluations and {sol.n_inner} L solves')
 
+        return sol.tau_opt, sol.L_opt, sol.G_opt, sol.u_opt
 
@@ -1,9 +1,15 @@
 from types import SimpleNamespace
+import logging
 import time
 import numpy as np
 from scipy import optimize, interpolate
 
-class hair_salon():
+import hysteresis
+from shared import ModelBase # shared modules at the root of the repository
+
+logger = logging.getLogger(__name__) # e.g. logging.getLogger('q2').setLevel(logging.INFO) to log every H
+
+class hair_salon(ModelBase):
 
     def __init__(self,do_print=True):
         """ initialize the model """
@@ -13,9 +19,35 @@ class hair_salon():
         self.par = SimpleNamespace() # create simplenamespace for parameters
         self.sol = SimpleNamespace() # create simplenamespace for solutions
         self.sim = SimpleNamespace()
+        self.stats = SimpleNamespace() # create simplenamespace for timing and counters
 
         if do_print: print(f'calling .setup()\n')
         self.setup() # calls setup function, defined below
+        self.reset_stats()
+
+    def reset_stats(self):
+        """ reset timing and counters """
+
+        stats = self.stats
+
+        stats.H_evaluations = 0 # number of evaluations of H (one per delta)
+        stats.simulations = 0 # number of simulated shock series
+        stats.periods = 0 # number of simulated periods
+        stats.optimizer_evaluations = 0 # number of objective evaluations of the last delta optimization
+        stats.time = 0.0 # total time spent evaluating H
+        stats.last_time = 0.0 # time of the last evaluation
+
+    def record_stats(self,t0,K,n=1):
+        """ add n evaluations of H with K simulations each, started at time t0, to the counters """
+
+        par = self.par
+        stats = self.stats
+
+        stats.last_time = time.time()-t0
+        stats.time += stats.last_time
+        stats.H_evaluations += n
+        stats.simulations += n*K
+        stats.periods += n*K*par.T
 
     def setup(self):
         """ setups baseline parameters """
@@ -172,13 +204,15 @@ class hair_salon():
         return discounting * period_value
     
 
-    def H(self,delta=0.0,K=50,new=False,do_print=False):
-        """ calculate H """
+    def H(self,delta=0.0,K=50,new=False,do_print=False,progress=None):
+        """ calculate H, progress is an optional callback called as progress(k,K) after each simulation """
 
         par = self.par
         sol = self.sol
         sim = self.sim
 
+        t0 = time.time()
+
         par.K = K # change K parameter with the call
         par.delta = delta # change delta parameter with the call
         # assert par.delta >= 0, 'delta cannot be negative' # check that delta is positive
@@ -192,7 +226,8 @@ class hair_salon():
 
         for k in range(par.K): # loop over number of random shock series (simulations)
             
-            print(f'Simulation {k} of {par.K}')
+            if do_print:
+                print(f'Simulation {k} of {par.K}')
 
             for t in range(par.T):
                 
@@ -255,26 +290,317 @@ class hair_salon():
                 print(f'\n>>> ex-post lifetime value (h) for {k}th simulation = {sol.h_plus[k]:6.3f}')
                 print(f'>>> average kappa for {k}th simulation = {sim.dyn_k_vec[k]:6.3f}\n')
 
+            if progress is not None:
+                progress(k+1,par.K)
+
         sol.avg_k = np.sum(sim.dyn_k_vec)/par.K # calculate average kappa across simulations
         sol.H_plus = np.sum(sol.h_plus)/par.K # calculate ex-ante expected value
+        self.record_stats(t0,par.K)
         
         if do_print:
             print(f'\n********************************************************************')
-        print(f'*** ex-ante expected lifetime value (H) = {sol.H_plus:6.3f} ***')
-        # print(f'*** average kappa across simulations = {sol.avg_k:6.3f} ***')
-        
-        if do_print:
+            print(f'*** ex-ante expected lifetime value (H) = {sol.H_plus:6.3f} ***')
             print(f'********************************************************************\n')
+        logger.info('delta = %.4f, K = %d: H = %.3f in %.3f secs',par.delta,par.K,sol.H_plus,self.stats.last_time)
 
         return sol.H_plus
 
-    def value_of_choice_H(self,delta,new=False,do_print=False):
-        """ calculate value of choice of delta """
+    def draw_shocks(self,K,seed=None,method='mc',n_rep=8):
+        """ draw the (K,T) matrix of random components of the demand shocks at once,
+            from the global np.random state or, given a seed, from a seeded np.random.Generator,
+            so np.random.seed makes every method reproducible
+
+        method is 'mc' (independent draws), 'antithetic' (the last K/2 series mirror the first K/2 around the mean)
+        or 'sobol' (n_rep independently scrambled Sobol sequences of K/n_rep series each),
+        K must be even for 'antithetic' and a multiple of n_rep for 'sobol'
 
-        return -self.H(delta,new=new,do_print=do_print)
+        """
 
-    def delta_solve2(self,min=0.0,max=0.2,new=False,do_print=False):
-        """ solve for delta """
+        par = self.par
+
+        mu = -0.5*par.sigma**2
+
+        if method == 'mc':
+            rng = np.random if seed is None else np.random.default_rng(seed)
+            return rng.normal(mu,par.sigma,size=(K,par.T))
+
+        # the other methods need a Generator, without a seed it is seeded from the global np.random state
+        rng = np.random.default_rng(np.random.randint(2**32) if seed is None else seed)
+        if method == 'antithetic':
+            if K % 2 != 0: raise ValueError(f'antithetic shocks need an even K, got K = {K}')
+            z = rng.standard_normal((K//2,par.T))
+            return mu + par.sigma*np.vstack((z,-z))
+        elif method == 'sobol':
+            if K % n_rep != 0: raise ValueError(f'sobol shocks need K to be a multiple of n_rep = {n_rep}, got K = {K}')
+            from scipy.stats import norm, qmc
+            u = np.vstack([qmc.Sobol(d=par.T,scramble=True,seed=rng).random(K//n_rep) for _ in range(n_rep)])
+            return mu + par.sigma*norm.ppf(u)
+        else:
+            raise ValueError(f"unknown shock drawing method {method!r}, use 'mc', 'antithetic' or 'sobol'")
+
+    def kappa_paths(self,eps):
+        """ calculate (K,T) kappa paths from the AR1 demand shock process, vectorized over periods """
+
+        par = self.par
+
+        # kappa_t = rho*kappa_t-1*exp(epsilon_t), i.e. log kappa_t = log kappa_init + (t+1)*log rho + cumulated epsilon
+        t = np.arange(eps.shape[1])
+
+        return par.kappa_init*par.rho**(t+1)*np.exp(np.cumsum(eps,axis=1))
+
+    def optimal_l_paths(self,kappa,new=False):
+        """ calculate (K,T) optimal l paths """
+
+        if new == False:
+            return self.expected_optimal_l(kappa)
+        else:
+            return self.new_expected_optimal_l(kappa,np.arange(kappa.shape[1]))
+
+    def H_vec(self,delta=0.0,K=50,new=False,do_print=False,eps=None):
+        """ calculate H with all K simulations of T periods as arrays,
+            eps is an optional pre-drawn (K,T) shock matrix reused across calls (common random numbers) """
+
+        par = self.par
+        sol = self.sol
+        sim = self.sim
+
+        t0 = time.time()
+
+        par.K = K # change K parameter with the call
+        par.delta = delta # change delta parameter with the call
+
+        # a. simulate shocks, kappa and optimal l paths
+        if eps is None:
+            eps = self.draw_shocks(par.K)
+        par.K = eps.shape[0]
+        kappa = self.kappa_paths(eps)
+        l_star = self.optimal_l_paths(kappa,new)
+
+        # b. ex-post values from the delta-band policy kernel, and ex-ante value
+        sol.h_plus = hysteresis.band_values(kappa,l_star,[par.delta],par.l_init,par.iota,par.eta,par.w,par.R)[0]
+        sim.dyn_k_vec = kappa.mean(axis=1) # average kappa of each simulation
+        sol.avg_k = sim.dyn_k_vec.mean()
+        sol.H_plus = sol.h_plus.mean()
+        self.record_stats(t0,par.K)
+
+        if do_print:
+            print(f'*** ex-ante expected lifetime value (H) = {sol.H_plus:6.3f} ***')
+        logger.info('delta = %.4f, K = %d: H = %.3f in %.3f secs',par.delta,par.K,sol.H_plus,self.stats.last_time)
+
+        return sol.H_plus
+
+    def H_se(self,delta=0.0,K=1024,new=False,method='mc',control=False,seed=None,n_rep=8):
+        """ estimate H and its standard error, with optional variance reduction
+
+        Args:
+
+            method (str): 'mc', 'antithetic' or 'sobol' shocks, see draw_shocks
+            control (bool): use the discounted sum of kappa, whose expectation is known, as control variate
+
+        Returns:
+
+            H (float): estimate of H
+            se (float): standard error of the estimate
+
+        """
+
+        par = self.par
+        sol = self.sol
+
+        t0 = time.time()
+
+        # a. shocks and independent groups of paths: single paths, antithetic pairs or Sobol replications
+        eps = self.draw_shocks(K,seed,method,n_rep)
+        K = eps.shape[0]
+        if method == 'antithetic':
+            groups = np.tile(np.arange(K//2),2)
+        elif method == 'sobol':
+            groups = np.repeat(np.arange(n_rep),K//n_rep)
+        else:
+            groups = np.arange(K)
+
+        # b. ex-post values
+        kappa = self.kappa_paths(eps)
+        l_star = self.optimal_l_paths(kappa,new)
+        h = hysteresis.band_values(kappa,l_star,[delta],par.l_init,par.iota,par.eta,par.w,par.R)[0]
+
+        # c. group means
+        n = np.bincount(groups)
+        h = np.bincount(groups,h)/n
+
+        # d. control variate, E[kappa_t] = kappa_init*rho**(t+1) as E[exp(epsilon)] = 1
+        if control:
+            discounting = par.R**-np.arange(par.T)
+            Z = np.bincount(groups,kappa@discounting)/n
+            EZ = np.sum(discounting*par.kappa_init*par.rho**(np.arange(par.T)+1))
+            b = np.cov(h,Z)[0,1]/np.var(Z,ddof=1)
+            h = h - b*(Z-EZ)
+
+        # e. estimate and standard error
+        sol.H_plus = h.mean()
+        sol.H_se = h.std(ddof=1)/np.sqrt(h.size)
+        self.record_stats(t0,K)
+        logger.info('delta = %.4f, K = %d, %s%s: H = %.3f (%.4f)',delta,K,method,' with control variate' if control else '',sol.H_plus,sol.H_se)
+
+        return sol.H_plus, sol.H_se
+
+    def H_grid(self,deltas,K=50,new=False,seed=None,eps=None):
+        """ calculate H for a whole vector of deltas in one pass over the same shock paths """
+
+        par = self.par
+
+        t0 = time.time()
+
+        # a. shared shocks, kappa paths and optimal l
+        if eps is None:
+            eps = self.draw_shocks(K,seed)
+        kappa = self.kappa_paths(eps)
+        l_star = self.optimal_l_paths(kappa,new)
+
+        # b. ex-post values for every (delta,simulation) from the delta-band policy kernel
+        h = hysteresis.band_values(kappa,l_star,deltas,par.l_init,par.iota,par.eta,par.w,par.R)
+        self.record_stats(t0,kappa.shape[0],n=h.shape[0])
+        logger.info('%d deltas, K = %d: best H = %.3f in %.3f secs',h.shape[0],kappa.shape[0],h.mean(axis=1).max(),self.stats.last_time)
+
+        return h.mean(axis=1)
+
+    def delta_search(self,min=0.0,max=0.2,n=21,levels=3,K=1000,seed=0,new=False,do_print=True):
+        """ solve for delta by coarse-to-fine grid search, with H evaluated for each grid at once on common random numbers """
+
+        par = self.par
+        sol = self.sol
+        sim = self.sim
+
+        self.reset_stats()
+
+        # a. common random numbers
+        sim.eps = self.draw_shocks(K,seed)
+
+        # b. refine the grid around the best delta
+        sol.delta_grid = np.zeros(0)
+        sol.H_grid = np.zeros(0)
+        lower, upper = min, max
+        for level in range(levels):
+            deltas = np.linspace(lower,upper,n)
+            H = self.H_grid(deltas,new=new,eps=sim.eps)
+            sol.delta_grid = np.append(sol.delta_grid,deltas)
+            sol.H_grid = np.append(sol.H_grid,H)
+
+            i = np.argmax(H)
+            step = deltas[1]-deltas[0]
+            lower, upper = np.fmax(deltas[i]-step,min), np.fmin(deltas[i]+step,max)
+
+        # c. the whole H(delta) curve, sorted by delta
+        I = np.argsort(sol.delta_grid)
+        sol.delta_grid = sol.delta_grid[I]
+        sol.H_grid = sol.H_grid[I]
+
+        i = np.argmax(sol.H_grid)
+        self.stats.optimizer_evaluations = sol.delta_grid.size
+        if do_print:
+            print(f'Optimal delta = {sol.delta_grid[i]:6.3f}, H = {sol.H_grid[i]:6.3f}, {sol.delta_grid.size} evaluations of H')
+
+        return sol.delta_grid[i], sol.H_grid[i]
+
+    def solve_dp(self,n_kappa=300,n_std=4.0,tol=0.0,do_print=True):
+        """ solve the firm's problem by backward induction on a discretized (kappa,l_t-1) state space,
+            tabulating the optimal policy for every period
+
+        Args:
+
+            n_kappa (int): number of log kappa grid points, the l grid is {l_init} and the static optimum of each kappa point
+            n_std (float): grid width in standard deviations of cumulated shocks over T periods
+            tol (float): stop early once the value function changes less than tol between periods, and reuse it for earlier periods
+
+        """
+
+        par = self.par
+        sol = self.sol
+
+        t0 = time.time()
+
+        # a. log kappa grid covering the paths from kappa_init over T periods
+        # log kappa_t = log kappa_t-1 + log rho + epsilon_t, a unit root in logs, so a Tauchen transition on a fixed grid is used
+        mu = np.log(par.rho)-0.5*par.sigma**2 # mean change of log kappa
+        spread = n_std*par.sigma*np.sqrt(par.T)
+        log_kappa = np.linspace(np.log(par.kappa_init)+np.fmin(mu*par.T,0)-spread,np.log(par.kappa_init)+np.fmax(mu*par.T,0)+spread,n_kappa)
+        P = tauchen(log_kappa,log_kappa+mu,par.sigma)
+        kappa = np.exp(log_kappa)
+
+        # b. l grid and period profits for every (kappa,l)
+        l = np.append(par.l_init,self.expected_optimal_l(kappa))
+        profit = kappa[:,None]*l[None,:]**(1-par.eta)-par.w*l[None,:]
+
+        # c. backward induction, keeping l_t-1 is free and any other l costs iota
+        sol.dp_policy = np.zeros((par.T,n_kappa,l.size),dtype=np.int16)
+        V_next = np.zeros((n_kappa,l.size))
+        keep = np.arange(l.size)[None,:]
+        sol.dp_iterations = 0
+        converged = False
+        for t in reversed(range(par.T)):
+
+            if converged: # reuse the policy
+                sol.dp_policy[t] = sol.dp_policy[t+1]
+                continue
+
+            W = profit + P @ V_next/par.R # value of choosing l in state kappa
+            best = np.argmax(W,axis=1) # best l when adjusting
+            adjust = W[np.arange(n_kappa),best][:,None]-par.iota > W
+
+            sol.dp_policy[t] = np.where(adjust,best[:,None],keep)
+            V = np.where(adjust,W[np.arange(n_kappa),best][:,None]-par.iota,W)
+
+            converged = tol > 0 and np.max(np.abs(V-V_next)) < tol
+            V_next = V
+            sol.dp_iterations += 1
+
+        # d. store grids
+        sol.dp_log_kappa = log_kappa
+        sol.dp_l = l
+        sol.dp_V = V_next
+
+        if do_print:
+            print(f'dynamic programming solved with {sol.dp_iterations} Bellman updates in {time.time()-t0:.2f} secs')
+
+    def H_dp(self,K=50,seed=None,eps=None):
+        """ calculate H of the tabulated dynamic programming policy, found by table lookup in every period """
+
+        par = self.par
+        sol = self.sol
+
+        t0 = time.time()
+
+        # a. kappa paths and their nearest grid points
+        if eps is None:
+            eps = self.draw_shocks(K,seed)
+        kappa = self.kappa_paths(eps)
+        step = sol.dp_log_kappa[1]-sol.dp_log_kappa[0]
+        i_kappa = np.clip(np.rint((np.log(kappa)-sol.dp_log_kappa[0])/step),0,sol.dp_log_kappa.size-1).astype(int)
+
+        # b. look up l and accumulate discounted period values
+        i_l = np.zeros(kappa.shape[0],dtype=int) # l_init
+        h = np.zeros(kappa.shape[0])
+        for t in range(par.T):
+            j = sol.dp_policy[t,i_kappa[:,t],i_l]
+            l = sol.dp_l[j]
+            h += par.R**-t*(kappa[:,t]*l**(1-par.eta)-par.w*l-par.iota*(j != i_l))
+            i_l = j
+
+        self.record_stats(t0,kappa.shape[0])
+        logger.info('dynamic programming policy, K = %d: H = %.3f in %.3f secs',kappa.shape[0],h.mean(),self.stats.last_time)
+
+        return h.mean()
+
+    def value_of_choice_H(self,delta,new=False,do_print=False,eps=None,K=50):
+        """ calculate value of choice of delta with K simulations """
+
+        if eps is None:
+            return -self.H(delta,K=K,new=new,do_print=do_print)
+        else: # same shocks for every delta
+            return -self.H_vec(delta,K=K,new=new,do_print=do_print,eps=eps)
+
+    def delta_solve2(self,min=0.0,max=0.2,new=False,do_print=False,K=50,seed=None):
+        """ solve for delta, given a seed with one shock matrix of K simulations reused for every delta """
 
         par = self.par
         sol = self.sol
@@ -284,11 +610,31 @@ class hair_salon():
         par.delta_min = min
         par.delta_max = max
 
-        # b. solve
-        sol.delta = optimize.minimize_scalar(self.value_of_choice_H,method='bounded',bounds=(par.delta_min,par.delta_max), args=(new,do_print))
+        self.reset_stats()
+
+        # b. common random numbers, drawn once
+        sim.eps = None if seed is None else self.draw_shocks(K,seed)
+
+        # c. solve
+        sol.delta = optimize.minimize_scalar(self.value_of_choice_H,method='bounded',bounds=(par.delta_min,par.delta_max), args=(new,do_print,sim.eps,K))
 
-        print(f'Optimal delta = {sol.delta.x:6.3f}, H = {-sol.delta.fun:6.3f}')
+        self.stats.optimizer_evaluations = sol.delta.nfev
+
+        print(f'Optimal delta = {sol.delta.x:6.3f}, H = {-sol.delta.fun:6.3f}, {sol.delta.nfev} evaluations of H')
 
         return sol.delta.x, -sol.delta.fun
-    
-   
+
+def tauchen(grid,mean,sigma):
+    """ transition matrix of x' = mean(x) + normal noise with std. sigma onto a uniform grid (Tauchen's method),
+        mean is the vector of conditional means at each grid point """
+
+    from scipy.stats import norm
+
+    step = grid[1]-grid[0]
+    upper = norm.cdf((grid[None,:]+step/2-mean[:,None])/sigma)
+    lower = norm.cdf((grid[None,:]-step/2-mean[:,None])/sigma)
+    upper[:,-1] = 1.0 # mass beyond the grid goes to the end points
+    lower[:,0] = 0.0
+
+    return upper-lower
+
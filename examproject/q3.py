@@ -1,61 +1,224 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import time
+
 import numpy as np
 from scipy.optimize import minimize
 import math
 
+import griewank_nd
+from basins import BasinCache
+
 def griewank(x):
-    """ return Griewank function """
-    return griewank_(x[0],x[1])
+    """ return Griewank function in any dimension """
+    return griewank_nd.griewank(x)
+
+def griewank_grad(x):
+    """ return the exact gradient of the Griewank function """
+    return griewank_nd.griewank_grad(x)
     
 def griewank_(x1,x2):
     """ define Griewank function """
     A = x1**2/4000 + x2**2/4000
-    B = np.cos(x1/np.sqrt(1))*np.cos(x2/np.sqrt(1))
+    B = np.cos(x1/np.sqrt(1))*np.cos(x2/np.sqrt(2))
     return A-B+1
 
-def refined_global_optimizer(bounds, tolerance, warmup_iterations, max_iterations, do_print = True):
+def format_point(x):
+    """ format a point of any dimension as (x1,x2,...) """
+    return '(' + ','.join(f'{xi:7.2f}' for xi in x) + ')'
+
+class MultiStartHistory:
+    """ compact history of a multi-start run, one row of (start, end, f, nfev) per local solve """
+
+    def __init__(self, max_iterations, dim):
+        """ preallocate the history """
+        self.start = np.full((max_iterations, dim), np.nan)
+        self.end = np.full((max_iterations, dim), np.nan)
+        self.f = np.full(max_iterations, np.nan)
+        self.nfev = np.zeros(max_iterations, dtype=np.int64)
+        self.n = 0 # number of local solves recorded
+        self.n_skipped = 0 # starts skipped by the basin cache
+        self.stop = None # reason the run stopped
+
+    def record(self, iteration, start, end, f, nfev):
+        """ record the local solve of an iteration """
+        self.start[iteration] = start
+        self.end[iteration] = end
+        self.f[iteration] = f
+        self.nfev[iteration] = nfev
+        self.n = max(self.n, iteration+1)
+
+    def trim(self):
+        """ drop the rows of iterations that were never run """
+        for name in ('start','end','f','nfev'):
+            setattr(self, name, getattr(self, name)[:self.n])
+        return self
+
+    @property
+    def total_nfev(self):
+        """ total function evaluations """
+        return int(self.nfev.sum())
+
+class MultiStartRun:
+    """ state of a refined multi-start run shared by the serial and parallel engines:
+        the best solution, the history, the stopping rules and the printing """
+
+    def __init__(self, warmup_iterations, max_iterations, dim, do_print, f_target, patience, time_budget):
+        """ start the run """
+        self.warmup_iterations = warmup_iterations
+        self.do_print = do_print
+        self.f_target = f_target
+        self.patience = patience
+        self.time_budget = time_budget
+
+        self.x_best = None  # Best solution found so far
+        self.f_best = np.inf  # Best function value found so far
+        self.best_iteration = None
+        self.last_improvement = 0
+        self.history = MultiStartHistory(max_iterations, dim)
+        self.t0 = time.perf_counter()
+
+    def starts(self, iterations, x_initial):
+        """ return the effective initial guesses, x_initial in the warm-up and pulled towards x_best after it """
+        x_initial_zero = np.array(x_initial, dtype=float)
+        for i, iteration in enumerate(iterations):
+            if iteration >= self.warmup_iterations:
+                capital_x_initial = 0.50 * 2/(1+math.exp((iteration - self.warmup_iterations)/100))
+                x_initial_zero[i] = capital_x_initial*x_initial_zero[i] + (1-capital_x_initial)*self.x_best
+        return x_initial_zero
+
+    def update(self, iterations, x0s, results):
+        """ record local solves and update the best solution in iteration order """
+        for iteration, x0, (x_current, f_current, success, nfev) in zip(iterations, x0s, results):
+            self.history.record(iteration, x0, x_current, f_current, nfev)
+
+            # Update the best solution if the optimizer converged to a new best
+            if success and (f_current < self.f_best or iteration == 0):
+                self.x_best = x_current
+                self.f_best = f_current
+                self.last_improvement = iteration
+                if iteration >= self.warmup_iterations:
+                    self.best_iteration = iteration
+                    if self.do_print:
+                        print(f'{iteration:4d}: x0 = {format_point(x0)}',end='')
+                        print(f' -> converged at {format_point(self.x_best)} with f = {self.f_best:12.8f}')
+
+    def check_stop(self, iteration):
+        """ record the stopping rule met after an iteration, returns True if the run should stop """
+        if self.f_target is not None and self.f_best <= self.f_target:
+            self.history.stop = 'f_target'
+        elif self.patience is not None and iteration >= self.warmup_iterations and iteration - self.last_improvement >= self.patience:
+            self.history.stop = 'patience'
+        elif self.time_budget is not None and time.perf_counter() - self.t0 >= self.time_budget:
+            self.history.stop = 'time_budget'
+        return self.history.stop is not None
+
+    def result(self, return_history, cache=None):
+        """ finish the history, print the best iteration and return the result of the engines """
+        history = self.history
+        history.stop = 'max_iterations' if history.stop is None else history.stop
+        history.n_skipped = 0 if cache is None else cache.n_skipped
+        history.trim()
+
+        # Effective initial guesses after the warm-up
+        initial_guesses = history.start[self.warmup_iterations:]
+
+        if self.do_print and self.best_iteration is not None:
+            print(f'Best iteration counting warm up{self.best_iteration:4d}\n',end='')
+            print(f'Best iteration not counting warm up{self.best_iteration - self.warmup_iterations:4d}',end='')
+
+        if return_history:
+            return self.x_best, initial_guesses, self.best_iteration, history
+        return self.x_best, initial_guesses, self.best_iteration
+
+def refined_global_optimizer(bounds, tolerance, warmup_iterations, max_iterations, do_print = True, dim = None,
+                             f_target = None, patience = None, time_budget = None, return_history = False, basin_cache = False):
     """ return the best solution, the best guesses and the best iteration by
-        optimizing the griewank function using multi-start """
-    x_best = None  # Best solution found so far
-    f_best = np.inf  # Best function value found so far
-    initial_guesses = []  # Store effective initial guesses
+        optimizing the griewank function in dim dimensions (default len(bounds)) using multi-start.
+        The run stops early when f_best <= f_target, when f_best has not improved for patience iterations
+        after the warm-up, or after time_budget seconds; with return_history the MultiStartHistory is returned as well.
+        With basin_cache starts close to a minimum already found are not solved, see BasinCache """
+    dim = len(bounds) if dim is None else dim
+    cache = BasinCache(dim, (bounds[1]-bounds[0])**dim) if basin_cache else None
+    run = MultiStartRun(warmup_iterations, max_iterations, dim, do_print, f_target, patience, time_budget)
 
     for iteration in range(max_iterations):
         # Draw random uniformly within chosen bounds
-        x_initial = np.random.uniform(bounds[0], bounds[1], len(bounds))
-
-        if iteration < warmup_iterations:
-            # Run BFGS optimizer with initial guess
-            x_initial_best = minimize(griewank, x_initial, method='BFGS', tol=tolerance)
-
-        else:
-            capital_x_initial = 0.50 * 2/(1+math.exp((iteration - warmup_iterations)/100))
-            x_initial_zero = capital_x_initial*x_initial + (1-capital_x_initial)*x_best
-            x_initial_best = minimize(griewank, x_initial_zero, method='BFGS', tol=tolerance)
-
-        # Check if the optimizer successfully converged
-        if x_initial_best.success:
-            x_current = x_initial_best.x
-            f_current = x_initial_best.fun
-
-            # Update the best solution if a new best is found
-            if f_current < f_best or iteration == 0:
-                x_best = x_current
-                f_best = f_current
-                if iteration >= warmup_iterations:
-                    best_iteration = iteration
-                    if do_print:
-                        print(f'{iteration:4d}: x0 = ({x_initial_zero[0]:7.2f},{x_initial_zero[1]:7.2f})',end='')
-                        print(f' -> converged at ({x_best[0]:7.2f},{x_best[1]:7.2f}) with f = {f_best:12.8f}')
-
-        # Check if warm-up iterations are completed
-        if iteration >= warmup_iterations:
-            # Store the effective initial guess
-            initial_guesses.append(x_initial_zero)
-    if do_print:
-        print(f'Best iteration counting warm up{best_iteration:4d}\n',end='')
-        print(f'Best iteration not counting warm up{best_iteration - warmup_iterations:4d}',end='')
-
-    return x_best, initial_guesses, best_iteration
+        x_initial = np.random.uniform(bounds[0], bounds[1], dim)
+        x_initial_zero = run.starts([iteration], x_initial[None])[0]
+
+        # Run BFGS optimizer with the effective initial guess
+        run.update([iteration], [x_initial_zero], solve_batch(cache, [x_initial_zero], tolerance))
+
+        # Check the stopping rules
+        if run.check_stop(iteration):
+            break
+
+    return run.result(return_history, cache)
+
+def local_solve(x0,tolerance):
+    """ run BFGS with the exact gradient on the Griewank function from x0, returning x, f, success and function evaluations """
+    res = minimize(griewank, x0, method='BFGS', jac=griewank_grad, tol=tolerance)
+    return res.x, res.fun, res.success, res.nfev
+
+def solve_batch(cache, x0s, tolerance, map_=map):
+    """ local_solve a batch of starts with map_, skipping those close to a minimum found before the batch, see BasinCache """
+    solve = partial(local_solve, tolerance=tolerance)
+    if cache is None:
+        return list(map_(solve, x0s))
+
+    # a. look up all starts before solving any of them
+    basins = [cache.lookup(x0) for x0 in x0s]
+    todo = [i for i, basin in enumerate(basins) if basin is None]
+
+    # b. solve the rest and add their minima
+    results = [None if basin is None else (cache.x_min[basin], cache.f_min[basin], True, 0) for basin in basins]
+    for i, (x, f, success, nfev) in zip(todo, map_(solve, np.asarray(x0s)[todo])):
+        if success:
+            cache.add(x, f)
+        results[i] = (x, f, success, nfev)
+    return results
+
+def refined_global_optimizer_parallel(bounds, tolerance, warmup_iterations, max_iterations, n_workers=None, wave_size=16, seed=None, do_print = True, dim = None,
+                                      f_target = None, patience = None, time_budget = None, return_history = False, basin_cache = False):
+    """ return the best solution, the best guesses and the best iteration of the refined multi-start,
+        with the warm-up starts solved as one batch and the refinement in waves of wave_size starts
+        against the best point found before each wave, across a process pool.
+        Starting points are drawn from a seeded generator, so the result does not depend on n_workers.
+        The stopping rules of refined_global_optimizer are checked after the warm-up batch and after each wave,
+        and with basin_cache each start is looked up against the minima found before its batch """
+    dim = len(bounds) if dim is None else dim
+    cache = BasinCache(dim, (bounds[1]-bounds[0])**dim) if basin_cache else None
+    run = MultiStartRun(warmup_iterations, max_iterations, dim, do_print, f_target, patience, time_budget)
+
+    # a. draw all random starting points at once
+    rng = np.random.default_rng(seed)
+    x_initial = rng.uniform(bounds[0], bounds[1], (max_iterations, dim))
+
+    pool = ProcessPoolExecutor(max_workers=n_workers) if n_workers != 1 else None
+    map_ = map if pool is None else pool.map
+
+    try:
+
+        # b. warm-up starts as one batch
+        warmup = range(min(warmup_iterations, max_iterations))
+        run.update(warmup, x_initial[warmup], solve_batch(cache, x_initial[warmup], tolerance, map_))
+        stop = len(warmup) > 0 and run.check_stop(warmup[-1])
+
+        # c. refinement in waves, each against the best point found before the wave
+        for start in range(warmup_iterations, max_iterations, wave_size):
+            if stop:
+                break
+            wave = range(start, min(start+wave_size, max_iterations))
+            x_initial_zero = run.starts(wave, x_initial[wave])
+            run.update(wave, x_initial_zero, solve_batch(cache, x_initial_zero, tolerance, map_))
+            stop = run.check_stop(wave[-1])
+
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return run.result(return_history, cache)
 
 def average_list(list):
     """ compute the average of lists """
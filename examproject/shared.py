@@ -0,0 +1,16 @@
+""" the modules shared by the projects, which live at the root of the repository, imported by putting it on the import path
+
+    from shared import ModelBase
+
+"""
+
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root not in sys.path:
+    sys.path.append(root)
+
+from modelbase import ModelBase, sweep
+
+__all__ = ['root','ModelBase','sweep']
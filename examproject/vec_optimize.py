@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+def minimize_scalar_bounded(fun,bounds,args=(),xatol=1e-5,maxiter=500):
+    """ minimize fun elementwise over bounds with a golden-section search on arrays,
+        i.e. many independent bounded scalar problems solved at once
+
+    Args:
+
+        fun (callable): objective, fun(x,*args) must broadcast over arrays
+        bounds (tuple): lower and upper bound, scalars or arrays
+        args (tuple): extra arguments of fun, scalars or arrays
+        xatol (float): absolute tolerance on x
+        maxiter (int): maximum number of iterations
+
+    Returns:
+
+        res (SimpleNamespace): x, fun, nit and nfev, like scipy's OptimizeResult
+
+    """
+
+    invphi = (np.sqrt(5)-1)/2 # inverse golden ratio
+
+    # a. broadcast bounds against the arguments
+    lower,upper = bounds
+    shape = np.broadcast(np.asarray(lower),np.asarray(upper),*[np.asarray(arg) for arg in args]).shape
+    a = np.broadcast_to(np.asarray(lower,dtype=float),shape).copy()
+    b = np.broadcast_to(np.asarray(upper,dtype=float),shape).copy()
+
+    # b. interior points
+    c = b - invphi*(b-a)
+    d = a + invphi*(b-a)
+    fc = fun(c,*args)
+    fd = fun(d,*args)
+    nfev = 2
+
+    # c. shrink all brackets together, one new evaluation per iteration
+    nit = int(np.ceil(np.log(xatol/np.max(b-a))/np.log(invphi))) if np.max(b-a) > xatol else 0
+    nit = min(nit,maxiter)
+    for _ in range(nit):
+
+        I = fc < fd # minimum is in [a,d]
+        b = np.where(I,d,b)
+        a = np.where(I,a,c)
+
+        x = np.where(I,b-invphi*(b-a),a+invphi*(b-a))
+        fx = fun(x,*args)
+        nfev += 1
+
+        c,d = np.where(I,x,d),np.where(I,c,x)
+        fc,fd = np.where(I,fx,fd),np.where(I,fc,fx)
+
+    # d. best interior point
+    I = fc < fd
+    return SimpleNamespace(x=np.where(I,c,d),fun=np.where(I,fc,fd),nit=nit,nfev=nfev)
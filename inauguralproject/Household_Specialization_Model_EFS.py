@@ -7,7 +7,9 @@ from scipy import optimize
 import pandas as pd 
 import matplotlib.pyplot as plt
 
-class HSMC:
+from shared import ModelBase, sweep # shared modules at the root of the repository
+
+class HSMC(ModelBase):
 
     def __init__(self):
         """ setup model """
@@ -283,16 +285,19 @@ class HSMC:
             text += f'{"":2s}'
         text += '\n'
     
-        # c. body
+        # c. body, HF/HM for all combinations of alpha and sigma
+        results = sweep(lambda: self,{'alpha':alpha_vec,'sigma':sigma_vec},relative_HF_HM)
         for i,x1 in enumerate(alpha_vec):
-            with np.errstate(all='ignore'):
-                if i > 0:   
-                    text += '\n'
-                text += f'{x1:3.2f} ' # left header
-                for j, x2 in enumerate(sigma_vec):
-                    par.alpha = x1
-                    par.sigma = x2
-                    text += f'{self.solve_discrete(relH=True):6.3f}'
+            if i > 0:   
+                text += '\n'
+            text += f'{x1:3.2f} ' # left header
+            for j, x2 in enumerate(sigma_vec):
+                text += f'{results.value[i*len(sigma_vec)+j]:6.3f}'
         
         # d. print
-        print(text)
\ No newline at end of file
+        print(text)
+
+def relative_HF_HM(model):
+    """ HF/HM of the discrete solution """
+    with np.errstate(all='ignore'):
+        return model.solve_discrete(relH=True)
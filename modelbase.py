@@ -0,0 +1,270 @@
+""" shared base of the model classes, which keep their state in par, sol and sim namespaces, and a parameter sweep runner
+
+The projects import it from the shared.py in their folder, which puts the root of the repository on the import path.
+
+"""
+
+import copy
+import itertools
+import math
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+def freeze(value):
+    """ return a hashable key of a parameter value, arrays are keyed by dtype, shape and content """
+
+    if isinstance(value,np.ndarray):
+        return ('ndarray',value.dtype.str,value.shape,value.tobytes())
+    elif isinstance(value,np.generic):
+        return value.item()
+    elif isinstance(value,(list,tuple)):
+        return (type(value).__name__,tuple(freeze(v) for v in value))
+    elif isinstance(value,dict):
+        return ('dict',tuple(sorted((k,freeze(v)) for k,v in value.items())))
+    elif isinstance(value,SimpleNamespace):
+        return ('namespace',freeze(vars(value)))
+
+    hash(value) # raises TypeError for other unhashable values
+    return value
+
+class FrozenPar:
+    """ frozen, hashable snapshot of a parameter namespace, with read-only copies of arrays """
+
+    def __init__(self,par):
+        """ take the snapshot """
+
+        values = {}
+        for name, value in vars(par).items():
+            if isinstance(value,np.ndarray):
+                value = np.array(value) # plain array, also for memory-mapped parameters
+                value.flags.writeable = False
+            else:
+                value = copy.deepcopy(value)
+            values[name] = value
+
+        object.__setattr__(self,'_values',values)
+        object.__setattr__(self,'_key',tuple(sorted((name,freeze(value)) for name, value in values.items())))
+        object.__setattr__(self,'_hash',hash(self._key))
+
+    def __getattr__(self,name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self,name,value):
+        raise AttributeError('parameter snapshots are read-only, use .replace()')
+
+    def __delattr__(self,name):
+        raise AttributeError('parameter snapshots are read-only, use .replace()')
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self,other):
+        return isinstance(other,FrozenPar) and self._hash == other._hash and self._key == other._key
+
+    def __repr__(self):
+        return f'FrozenPar({", ".join(self._values)})'
+
+    def __reduce__(self):
+        return (FrozenPar,(self.thaw(),))
+
+    def thaw(self):
+        """ return a mutable namespace with writable copies of arrays """
+
+        return SimpleNamespace(**{name: np.array(value) if isinstance(value,np.ndarray) else copy.deepcopy(value) for name, value in self._values.items()})
+
+    def replace(self,**overrides):
+        """ return a snapshot with some parameters replaced """
+
+        par = self.thaw()
+        for name, value in overrides.items():
+            setattr(par,name,value)
+
+        return FrozenPar(par)
+
+class ModelBase:
+    """ base of the model classes, adds parameter snapshots, copies with overrides, pickling, memoization
+        and allocation of solution vectors """
+
+    # storage of the solution vectors, set on an instance to change it, not part of par and its snapshots
+    sol_vectors = () # names of the vectors in sol allocated by .allocate()
+    sol_dtype = np.float64 # e.g. np.float32 to halve memory
+    sol_memmap = None # file prefix to memory-map the solution vectors to, as {sol_memmap}_{name}.dat
+
+    def allocate(self,n):
+        """ allocate the solution vectors of length n, reset on every solve """
+
+        for name in self.sol_vectors:
+            if self.sol_memmap is None:
+                setattr(self.sol,name,np.zeros(n,dtype=self.sol_dtype))
+            else: # memory-mapped files for very large sweeps
+                setattr(self.sol,name,np.memmap(f'{self.sol_memmap}_{name}.dat',dtype=self.sol_dtype,mode='w+',shape=(n,)))
+
+    def snapshot(self):
+        """ return a frozen, hashable snapshot of par """
+
+        return FrozenPar(self.par)
+
+    def restore(self,snapshot):
+        """ set par to a mutable copy of a snapshot """
+
+        self.par = snapshot.thaw()
+
+    def copy(self,**overrides):
+        """ return a copy with its own par, with overrides of existing parameters applied
+
+        par is copied shallowly, i.e. arrays are shared until they are rebound in one of the copies,
+        which is how the solve methods change parameters, and the other namespaces are copied deeply.
+
+        """
+
+        other = object.__new__(type(self))
+        other.__dict__.update(vars(self))
+        for name, value in vars(self).items():
+            if name == 'par':
+                other.par = SimpleNamespace(**vars(self.par))
+            elif name == '_memo':
+                other._memo = {}
+            elif isinstance(value,SimpleNamespace):
+                setattr(other,name,copy.deepcopy(value))
+
+        for name, value in overrides.items():
+            if not hasattr(other.par,name): raise AttributeError(f'{type(self).__name__} has no parameter {name}')
+            setattr(other.par,name,value)
+
+        return other
+
+    def cached(self,method,*args,**kwargs):
+        """ return self.method(*args,**kwargs), memoized on the method, the arguments and a snapshot of par,
+            for methods whose result only depends on par and the arguments.
+            The state of random number generators is not part of the key, so methods that draw random numbers
+            must be passed their shocks or a seed, e.g. .cached('H_vec',delta,K=K,eps=eps).
+            The method is called on a copy, so parameters it overwrites do not change the model or later keys """
+
+        key = (method,self.snapshot(),freeze(args),freeze(kwargs))
+
+        memo = self.__dict__.setdefault('_memo',{})
+        if key not in memo:
+            memo[key] = getattr(self.copy(),method)(*args,**kwargs)
+
+        return memo[key]
+
+    def __getstate__(self):
+        """ pickle the namespaces without the memo, with memory-mapped arrays as plain arrays """
+
+        state = {}
+        for name, value in vars(self).items():
+            if name == '_memo': continue
+            if isinstance(value,SimpleNamespace):
+                value = SimpleNamespace(**{k: np.array(v) if isinstance(v,np.memmap) else v for k,v in vars(value).items()})
+            state[name] = value
+
+        return state
+
+def grid_points(grid):
+    """ return the points of a parameter grid, either a dict of values per parameter (all combinations) or a list of dicts """
+
+    if isinstance(grid,dict):
+        return [dict(zip(grid,values)) for values in itertools.product(*grid.values())]
+
+    return [dict(point) for point in grid]
+
+def solve_points(factory,extract,points):
+    """ return the outputs of a chunk of points, each extracted from a copy of one model from the factory """
+
+    model = factory()
+    return [extract(model.copy(**point)) for point in points]
+
+def load_checkpoint(path,points):
+    """ return the outputs saved in a checkpoint file by point index, and start the file if it does not exist """
+
+    done = {}
+
+    # a. new checkpoint, the header identifies the grid
+    if not os.path.exists(path):
+        with open(path,'wb') as f:
+            pickle.dump(freeze(points),f)
+        return done
+
+    # b. saved chunks, up to the last complete one
+    with open(path,'rb+') as f:
+        if pickle.load(f) != freeze(points):
+            raise ValueError(f'checkpoint {path} is of another parameter grid')
+        end = f.tell()
+        while True:
+            try:
+                indices, outputs = pickle.load(f)
+            except (EOFError,pickle.UnpicklingError): # end of file or a chunk cut off by an interruption
+                break
+            done.update(zip(indices,outputs))
+            end = f.tell()
+        f.truncate(end)
+
+    return done
+
+def sweep(factory,grid,extract,backend='serial',n_workers=None,chunk_size=None,checkpoint=None):
+    """ solve a model for every point of a parameter grid and return a tidy table
+
+    Args:
+
+        factory (callable): returns the model, e.g. the model class, called once per chunk
+        grid (dict or list): values per parameter, all combinations are solved, or a list of dicts of parameters
+        extract (callable): returns the output of a model copy with the parameters of a point,
+            a scalar or a dict of named outputs, e.g. lambda model: model.solve().HF
+        backend (str): 'serial', 'thread' or 'process', for 'process' factory and extract must be picklable,
+            i.e. defined at module level
+        n_workers (int): number of threads or processes, default is the number of cores
+        chunk_size (int): points per task, default gives 4 chunks per worker
+        checkpoint (str): file the outputs are saved to after each chunk, an interrupted sweep resumes from it
+
+    Returns:
+
+        results (DataFrame): a row per point, with a column per parameter and per output ('value' for scalars)
+
+    """
+
+    points = grid_points(grid)
+
+    # a. outputs saved by an earlier, interrupted run
+    done = {} if checkpoint is None else load_checkpoint(checkpoint,points)
+    todo = [i for i in range(len(points)) if i not in done]
+
+    # b. chunks of points
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    chunk_size = max(1,math.ceil(len(todo)/(4*n_workers))) if chunk_size is None else chunk_size
+    chunks = [todo[i:i+chunk_size] for i in range(0,len(todo),chunk_size)]
+
+    def save(chunk,outputs):
+        """ keep the outputs of a finished chunk """
+        done.update(zip(chunk,outputs))
+        if checkpoint is not None:
+            with open(checkpoint,'ab') as f:
+                pickle.dump((chunk,outputs),f)
+
+    # c. solve the chunks
+    if backend == 'serial':
+        for chunk in chunks:
+            save(chunk,solve_points(factory,extract,[points[i] for i in chunk]))
+    elif backend in ('thread','process'):
+        Executor = ThreadPoolExecutor if backend == 'thread' else ProcessPoolExecutor
+        with Executor(max_workers=n_workers) as pool:
+            futures = {pool.submit(solve_points,factory,extract,[points[i] for i in chunk]): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                save(futures[future],future.result())
+    else:
+        raise ValueError(f"unknown backend {backend!r}, use 'serial', 'thread' or 'process'")
+
+    # d. tidy table, one row per point
+    rows = []
+    for i, point in enumerate(points):
+        output = done[i] if isinstance(done[i],dict) else {'value':done[i]}
+        rows.append({**point,**output})
+
+    return pd.DataFrame(rows)
@@ -5,7 +5,9 @@ import numpy as np
 from scipy import optimize
 import matplotlib.pyplot as plt
 
-class OLGModelClass():
+from shared import ModelBase # shared modules at the root of the repository
+
+class OLGModelClass(ModelBase):
 
     def __init__(self,do_print=True):
         """ initialize the model """